@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Benchmark HTTP/1.1 vs HTTP/2 through the proxy.
+
+Starts mitmdump twice (once with --no-http2, once with HTTP/2 enabled),
+fires a burst of concurrent requests at the same URL through it and reports
+how many client/server connections the proxy saw and the request latency.
+
+Usage:
+    python bench/bench_http2.py --url https://example.com/ --requests 200 --concurrency 50
+
+Requires httpx with HTTP/2 support (pip install "httpx[http2]") and the
+mitmproxy CA certificate in ~/.mitmproxy (created on the first mitmdump run).
+
+When loaded by mitmdump with -s, this file acts as a connection counting addon.
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+class ConnectionCounter:
+    """mitmproxy addon counting client and upstream connections"""
+
+    def __init__(self):
+        self.client_connections = 0
+        self.server_connections = 0
+        self.http_versions = {}
+
+    def load(self, loader):
+        loader.add_option("bench_stats", str, "", "File to write connection counts to on shutdown")
+
+    def client_connected(self, client):
+        self.client_connections += 1
+
+    def server_connected(self, data):
+        self.server_connections += 1
+
+    def request(self, flow):
+        version = flow.request.http_version
+        self.http_versions[version] = self.http_versions.get(version, 0) + 1
+
+    def done(self):
+        from mitmproxy import ctx
+
+        if ctx.options.bench_stats:
+            with open(ctx.options.bench_stats, "w") as f:
+                json.dump({
+                    "client_connections": self.client_connections,
+                    "server_connections": self.server_connections,
+                    "http_versions": self.http_versions,
+                }, f)
+
+
+def wait_for_port(port, timeout=15.0):
+    """Wait until something listens on the given local port"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+async def run_client(url, port, total, concurrency, http2):
+    """Fire `total` requests with at most `concurrency` in flight, return latencies"""
+    import httpx
+
+    ca_cert = os.path.expanduser("~/.mitmproxy/mitmproxy-ca-cert.pem")
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async with httpx.AsyncClient(
+        proxy=f"http://127.0.0.1:{port}",
+        http2=http2,
+        verify=ca_cert if os.path.exists(ca_cert) else False,
+        limits=limits,
+        timeout=30.0,
+    ) as client:
+
+        async def one():
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(url)
+                    await response.aread()
+                    latencies.append(time.perf_counter() - start)
+                except httpx.HTTPError:
+                    errors += 1
+
+        wall_start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        wall = time.perf_counter() - wall_start
+
+    return latencies, errors, wall
+
+
+def run_mode(args, http2):
+    """Run one benchmark pass with HTTP/2 enabled or disabled"""
+    stats_file = tempfile.NamedTemporaryFile(suffix=".json", delete=False).name
+    cmd = [
+        args.mitmdump, "-q",
+        "--listen-port", str(args.port),
+        "-s", os.path.abspath(__file__),
+        "--set", f"bench_stats={stats_file}",
+    ]
+    if not http2:
+        cmd.append("--no-http2")
+    if args.insecure:
+        cmd.append("--ssl-insecure")
+
+    proxy = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_for_port(args.port):
+            raise RuntimeError("mitmdump did not start listening")
+
+        # Warm up once so certificate generation is not part of the numbers
+        asyncio.run(run_client(args.url, args.port, 1, 1, http2))
+        latencies, errors, wall = asyncio.run(
+            run_client(args.url, args.port, args.requests, args.concurrency, http2)
+        )
+    finally:
+        proxy.send_signal(signal.SIGINT)
+        try:
+            proxy.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proxy.kill()
+
+    with open(stats_file) as f:
+        counts = json.load(f)
+    os.unlink(stats_file)
+
+    return {
+        "mode": "HTTP/2" if http2 else "HTTP/1.1",
+        "requests": len(latencies),
+        "errors": errors,
+        "wall": wall,
+        "p50": statistics.median(latencies) if latencies else 0.0,
+        "p95": statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else 0.0,
+        **counts,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare HTTP/1.1 and HTTP/2 through mitmdump")
+    parser.add_argument("--url", default="https://example.com/", help="URL to request (HTTPS for HTTP/2)")
+    parser.add_argument("--requests", type=int, default=200, help="Total number of requests")
+    parser.add_argument("--concurrency", type=int, default=50, help="Requests in flight at once")
+    parser.add_argument("--port", type=int, default=4590, help="Port for the benchmark proxy")
+    parser.add_argument("--mitmdump", default="mitmdump", help="Path to the mitmdump binary")
+    parser.add_argument("--insecure", action="store_true", help="Don't verify upstream certificates")
+    args = parser.parse_args()
+
+    try:
+        import httpx  # noqa: F401
+        import h2  # noqa: F401
+    except ImportError:
+        print('[!] This benchmark needs httpx with HTTP/2 support: pip install "httpx[http2]"')
+        sys.exit(1)
+
+    results = [run_mode(args, http2=False), run_mode(args, http2=True)]
+
+    print(f"\n{args.requests} requests to {args.url}, {args.concurrency} concurrent\n")
+    print(f"{'mode':<10} {'ok':>6} {'err':>5} {'client conns':>13} {'server conns':>13} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'wall s':>8}")
+    for r in results:
+        print(f"{r['mode']:<10} {r['requests']:>6} {r['errors']:>5} {r['client_connections']:>13} "
+              f"{r['server_connections']:>13} {r['p50'] * 1000:>8.1f} {r['p95'] * 1000:>8.1f} {r['wall']:>8.2f}")
+    print("")
+    for r in results:
+        versions = ", ".join(f"{v}: {n}" for v, n in sorted(r["http_versions"].items()))
+        print(f"{r['mode']:<10} negotiated {versions or '-'}")
+    print("")
+
+
+if __name__ == "__main__":
+    main()
+else:
+    addons = [ConnectionCounter()]
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Benchmark User-Agent classification per request.
+
+Compares the cached classifier from ua_classifier.py with the three substring
+checks the addons used before, on a stream of requests drawn from a small set
+of User-Agent strings like a real fleet sends.
+
+Usage:
+    python bench/bench_ua.py --requests 1000000 --distinct 50
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+WORK_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, WORK_DIR)
+
+from ua_classifier import UaClassifier  # noqa: E402
+
+SAMPLE_USER_AGENTS = [
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 Safari/537.36 Edg/{v}.0.0.0",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_2 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/{v}.0 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (X11; Linux x86_64; rv:{v}.0) Gecko/20100101 Firefox/{v}.0",
+    "MyApp/{v}.1 CFNetwork/1490.0.4 Darwin/23.2.0",
+    "okhttp/4.{v}.0",
+    "Dalvik/2.1.0 (Linux; U; Android 14; Pixel 8 Build/UD1A.{v})",
+]
+
+
+def substring_checks(user_agent):
+    """The classification the addons did before the rules file"""
+    app_info = ""
+    if "Safari" in user_agent:
+        app_info = "Safari"
+    elif "Chrome" in user_agent:
+        app_info = "Chrome"
+    elif "Firefox" in user_agent:
+        app_info = "Firefox"
+    return app_info
+
+
+def run(classify, user_agents):
+    start = time.perf_counter()
+    for user_agent in user_agents:
+        classify(user_agent)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark User-Agent classification")
+    parser.add_argument("--requests", type=int, default=1000000, help="Number of classified requests")
+    parser.add_argument("--distinct", type=int, default=50, help="Number of distinct User-Agent strings")
+    args = parser.parse_args()
+
+    pool = [
+        SAMPLE_USER_AGENTS[i % len(SAMPLE_USER_AGENTS)].format(v=100 + i)
+        for i in range(args.distinct)
+    ]
+    # Header values are new str objects on every request, so copy them
+    user_agents = ["".join(list(random.choice(pool))) for _ in range(args.requests)]
+
+    classifier = UaClassifier(os.path.join(WORK_DIR, "ua_rules.yaml"))
+    baseline = run(substring_checks, user_agents)
+    cached = run(classifier.classify, user_agents)
+    info = classifier.cache_info()
+    parsed = info.misses
+
+    print(f"\n{args.requests} requests, {args.distinct} distinct User-Agents\n")
+    print(f"substring checks: {baseline / args.requests * 1e9:.0f} ns/request")
+    print(f"cached rules:     {cached / args.requests * 1e9:.0f} ns/request "
+          f"({parsed} User-Agents parsed)")
+    print("")
+    for user_agent in pool[:len(SAMPLE_USER_AGENTS)]:
+        print(f"  {substring_checks(user_agent) or '-':<8} -> {classifier.classify(user_agent)}")
+    print("")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Load test for the Proxy Monitor UI.
+
+Starts the UI server, connects many Socket.IO dashboard clients, broadcasts
+synthetic requests through the server and reports how long delivery took and
+how much server memory each connected client costs.
+
+Usage:
+    python bench/loadtest_ui.py --clients 300 --events 50
+    python bench/loadtest_ui.py --clients 300 --async-mode eventlet
+
+Requires the Socket.IO asyncio client: pip install aiohttp
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+WORK_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def server_rss_kb(pid):
+    """Resident memory of a process in KB"""
+    output = subprocess.run(["ps", "-o", "rss=", "-p", str(pid)], capture_output=True, text=True).stdout
+    return int(output.strip() or 0)
+
+
+def post_json(url, data):
+    request = urllib.request.Request(
+        url, data=json.dumps(data).encode(), headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return json.load(response)
+
+
+def wait_for_server(url, timeout=20.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+async def run_clients(args, server):
+    import socketio
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    latencies = []
+    received = 0
+    clients = []
+
+    async def connect_one():
+        nonlocal received
+        client = socketio.AsyncClient(reconnection=False)
+
+        @client.on("new_request")
+        async def on_request(data):
+            nonlocal received
+            received += 1
+            if "sent_at" in data:
+                latencies.append(time.time() - data["sent_at"])
+
+        await client.connect(base_url, transports=["websocket"])
+        clients.append(client)
+
+    rss_before = server_rss_kb(server.pid)
+
+    # Connect in batches so the connect storm itself isn't the test
+    for start in range(0, args.clients, 50):
+        batch = min(50, args.clients - start)
+        await asyncio.gather(*(connect_one() for _ in range(batch)))
+    await asyncio.sleep(1)
+
+    rss_connected = server_rss_kb(server.pid)
+
+    # Broadcast events spaced out like a busy proxy would produce them
+    loop = asyncio.get_running_loop()
+    for _ in range(args.events):
+        await loop.run_in_executor(None, post_json, f"{base_url}/api/debug/emit", {"count": 1})
+        await asyncio.sleep(args.interval)
+
+    # Give the last events time to arrive
+    expected = args.clients * args.events
+    deadline = time.monotonic() + 10
+    while received < expected and time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+
+    await asyncio.gather(*(client.disconnect() for client in clients), return_exceptions=True)
+
+    return {
+        "connected": len(clients),
+        "expected": expected,
+        "received": received,
+        "latencies": latencies,
+        "rss_before": rss_before,
+        "rss_connected": rss_connected,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Proxy Monitor UI with many dashboard clients")
+    parser.add_argument("--clients", type=int, default=200, help="Number of dashboard clients")
+    parser.add_argument("--events", type=int, default=50, help="Number of broadcast events")
+    parser.add_argument("--interval", type=float, default=0.05, help="Seconds between events")
+    parser.add_argument("--port", type=int, default=5699, help="Port for the UI server under test")
+    parser.add_argument("--async-mode", choices=["gevent", "eventlet"], default="gevent",
+                        help="Async worker model passed to serve_ui.py")
+    args = parser.parse_args()
+
+    try:
+        import socketio  # noqa: F401
+        import aiohttp  # noqa: F401
+    except ImportError:
+        print("[!] This load test needs the Socket.IO asyncio client: pip install python-socketio aiohttp")
+        sys.exit(1)
+
+    cmd = [
+        sys.executable, os.path.join(WORK_DIR, "serve_ui.py"),
+        "--host", "127.0.0.1", "--port", str(args.port),
+        "--async-mode", args.async_mode, "--max-clients", str(args.clients + 100),
+    ]
+
+    env = dict(os.environ, PROXY_UI_LOADTEST="1")
+    server = subprocess.Popen(cmd, cwd=WORK_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_for_server(f"http://127.0.0.1:{args.port}/api/proxy/state"):
+            print("[!] UI server did not start")
+            sys.exit(1)
+        result = asyncio.run(run_clients(args, server))
+    finally:
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    latencies = sorted(result["latencies"])
+    per_client_kb = (result["rss_connected"] - result["rss_before"]) / max(result["connected"], 1)
+
+    print(f"\n{args.async_mode} server, {result['connected']}/{args.clients} clients connected, {args.events} events\n")
+    print(f"delivered:        {result['received']}/{result['expected']}")
+    if latencies:
+        quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        print(f"latency p50:      {statistics.median(latencies) * 1000:.1f} ms")
+        print(f"latency p95:      {quantiles[94] * 1000:.1f} ms")
+        print(f"latency p99:      {quantiles[98] * 1000:.1f} ms")
+        print(f"latency max:      {latencies[-1] * 1000:.1f} ms")
+    print(f"server RSS:       {result['rss_before'] / 1024:.1f} MB idle, {result['rss_connected'] / 1024:.1f} MB connected")
+    print(f"memory/client:    {per_client_kb:.1f} KB")
+    print("")
+
+
+if __name__ == "__main__":
+    main()
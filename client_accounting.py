@@ -0,0 +1,220 @@
+"""
+Per-client traffic accounting and fair-share throttling.
+
+Counts requests, bytes and open connections per source client (the client's
+IP address) in a bounded table of the most recently active clients, and
+periodically prints the top clients as a status line that the UI shows on the
+dashboard:
+
+    [12:34:56] ·· top clients: 10.0.0.5 (812 requests, 41.2 MB, 6 connections, 120 throttled); ...
+
+Optionally every client gets its own token buckets for requests and response
+bandwidth, so one misbehaving machine can't starve everyone else behind a
+shared proxy. Clients over their limit are paced: their flows wait with
+asyncio.sleep() while everyone else's flows keep moving.
+
+    client_limit_rps        requests per second per client (0 = unlimited)
+    client_limit_burst      requests a client may send at once (default 20)
+    client_limit_kbps       response KB per second per client (0 = unlimited)
+
+Requests are paced in requestheaders, before any addon's request hook sends
+them upstream. The bandwidth limit is a single delay before the whole
+response body is sent, not a shaped transfer. Streamed responses (e.g.
+file-backed interceptor rules) are already sent when they are counted, so
+their size (from Content-Length) is charged to the bucket and the client's
+next responses wait for it instead.
+
+Enable it with ./proxy.sh --clients (--client-rps N / --client-kbps N set the
+limits).
+"""
+from mitmproxy import ctx, http
+import asyncio
+import collections
+import datetime
+
+from console_renderer import get_renderer
+from token_bucket import TokenBucket
+
+# Clients listed in the status line
+TOP_CLIENTS = 5
+
+
+class ClientStats:
+    def __init__(self):
+        self.requests = 0
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.active = 0
+        self.throttled = 0
+        self.delay = 0.0
+
+        # Created on first use, only when limits are set
+        self.request_bucket = None
+        self.bandwidth_bucket = None
+
+    @property
+    def bytes(self):
+        return self.bytes_received + self.bytes_sent
+
+
+def format_bytes(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+class ClientAccounting:
+    def __init__(self):
+        # Stats per client address, least recently active first
+        self.clients = collections.OrderedDict()
+        self.console = get_renderer()
+        self.reporter = None
+        self.last_line = None
+
+    def load(self, loader):
+        loader.add_option(
+            "client_limit_rps", int, 0,
+            "Requests per second allowed per client, excess requests are delayed (0 = unlimited)"
+        )
+        loader.add_option(
+            "client_limit_burst", int, 20,
+            "Requests a client may send at once before client_limit_rps applies"
+        )
+        loader.add_option(
+            "client_limit_kbps", int, 0,
+            "Response bandwidth per client in KB/s, excess responses are delayed (0 = unlimited)"
+        )
+        loader.add_option(
+            "client_max_tracked", int, 1024,
+            "Maximum number of clients with their own statistics"
+        )
+        loader.add_option(
+            "client_report_interval", int, 5,
+            "Seconds between top clients status lines"
+        )
+
+    def configure(self, updated):
+        # Buckets are recreated with the new limits on next use
+        if {"client_limit_rps", "client_limit_burst", "client_limit_kbps"} & set(updated):
+            for stats in self.clients.values():
+                stats.request_bucket = None
+                stats.bandwidth_bucket = None
+
+    def running(self):
+        self.reporter = asyncio.ensure_future(self.report_periodically())
+
+    def done(self):
+        if self.reporter:
+            self.reporter.cancel()
+        self.report(final=True)
+
+    def stats_for(self, address):
+        """Get a client's stats from the bounded LRU table"""
+        stats = self.clients.get(address)
+        if stats is None:
+            stats = self.clients[address] = ClientStats()
+            while len(self.clients) > ctx.options.client_max_tracked:
+                self.clients.popitem(last=False)
+        else:
+            self.clients.move_to_end(address)
+        return stats
+
+    def client_connected(self, client):
+        self.stats_for(client.peername[0]).active += 1
+
+    def client_disconnected(self, client):
+        stats = self.clients.get(client.peername[0])
+        # The client may have been evicted while connected
+        if stats is not None and stats.active > 0:
+            stats.active -= 1
+
+    async def requestheaders(self, flow: http.HTTPFlow):
+        stats = self.stats_for(flow.client_conn.peername[0])
+        stats.requests += 1
+
+        # Paced here rather than in request, so the flow waits before other
+        # addons (e.g. upstream_pool) fetch it upstream
+        rate = ctx.options.client_limit_rps
+        if rate:
+            if stats.request_bucket is None:
+                stats.request_bucket = TokenBucket(rate, max(ctx.options.client_limit_burst, 1))
+            await self.pace(stats, stats.request_bucket.reserve())
+
+    def request(self, flow: http.HTTPFlow):
+        stats = self.stats_for(flow.client_conn.peername[0])
+        stats.bytes_received += len(flow.request.raw_content or b"")
+
+    async def response(self, flow: http.HTTPFlow):
+        stats = self.stats_for(flow.client_conn.peername[0])
+        if flow.response.raw_content is not None:
+            size = len(flow.response.raw_content)
+        else:
+            # Streamed responses are counted, but already sent
+            size = int(flow.response.headers.get("Content-Length", 0) or 0)
+        stats.bytes_sent += size
+
+        rate = ctx.options.client_limit_kbps * 1024
+        if rate:
+            if stats.bandwidth_bucket is None:
+                # One second worth of bandwidth may go out at once
+                stats.bandwidth_bucket = TokenBucket(rate, rate)
+            delay = stats.bandwidth_bucket.reserve(size)
+            # One delay for the whole body, before it is sent. Streamed bodies
+            # are already sent, their debt holds back the client's next responses
+            if flow.response.raw_content is not None:
+                await self.pace(stats, delay)
+
+    async def pace(self, stats, delay):
+        """Hold back a flow of a client that is over its limit"""
+        if delay > 0:
+            stats.throttled += 1
+            stats.delay += delay
+            await asyncio.sleep(delay)
+
+    def top_clients(self):
+        return sorted(
+            self.clients.items(), key=lambda item: (item[1].requests, item[1].bytes), reverse=True
+        )[:TOP_CLIENTS]
+
+    def status_line(self):
+        entries = []
+        for address, stats in self.top_clients():
+            entry = f"{address} ({stats.requests} requests, {format_bytes(stats.bytes)}, {stats.active} connections"
+            if stats.throttled:
+                entry += f", {stats.throttled} throttled"
+            entries.append(entry + ")")
+        return "; ".join(entries)
+
+    async def report_periodically(self):
+        while True:
+            await asyncio.sleep(max(ctx.options.client_report_interval, 1))
+            self.report()
+
+    def report(self, final=False):
+        """Print the top clients, and log them when the proxy stops"""
+        line = self.status_line()
+        if not line:
+            return
+
+        message = f"[{datetime.datetime.now().strftime('%H:%M:%S')}] ·· top clients: {line}"
+        if not final:
+            if line != self.last_line:
+                self.last_line = line
+                self.console.info(message)
+            return
+
+        # The console renderer is closed by the URL addon by now
+        print(message)
+        with open("logs/url_log.txt", "a") as f:
+            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            f.write(f"\n[{timestamp}] Clients: {len(self.clients)} tracked\n")
+            for address, stats in self.top_clients():
+                f.write(
+                    f"    {address}: {stats.requests} requests, {format_bytes(stats.bytes_received)} received, "
+                    f"{format_bytes(stats.bytes_sent)} sent, {stats.throttled} throttled "
+                    f"({stats.delay:.1f}s delayed)\n"
+                )
+
+# Configure mitmproxy to use our addon
+addons = [ClientAccounting()]
@@ -0,0 +1,158 @@
+"""
+Non-blocking console output for the proxy addons.
+
+mitmproxy runs addon hooks on its event loop, so a print() to a slow terminal
+or a full pipe (e.g. proxy_ui not reading fast enough) stalls the whole proxy.
+The renderer queues output in a bounded buffer and a background thread writes
+it in batches. Hooks never wait for stdout: when the buffer is full, lines are
+dropped and counted instead. Dropped request lines are reported as
+"·· console too slow, dropped N requests" so proxy_ui's totals stay exact.
+
+When more requests arrive than a human can read, the renderer switches to a
+once per second summary ("N requests/s, top hosts") until the rate drops again.
+"""
+import collections
+import datetime
+import sys
+import threading
+import time
+
+# Maximum number of distinct hosts tracked per summary window
+MAX_SUMMARY_HOSTS = 1000
+
+
+class ConsoleRenderer:
+    def __init__(self, stream=None, max_queue=10000, max_lines_per_sec=30, batch_interval=0.1, summary="auto"):
+        self.stream = stream or sys.stdout
+        self.max_queue = max_queue
+        self.max_lines_per_sec = max_lines_per_sec
+        self.batch_interval = batch_interval
+        self.summary = summary
+
+        # Pending output, shared with the writer thread
+        self.lock = threading.Lock()
+        self.pending = collections.deque()
+        self.dropped = 0
+        self.dropped_requests = 0
+
+        # Requests seen in the current one second window
+        self.window_start = time.monotonic()
+        self.window_requests = 0
+        self.window_hosts = collections.Counter()
+
+        self.summary_mode = False
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="console-renderer", daemon=True)
+        self.thread.start()
+
+    def summary_enabled(self):
+        """Summaries replace the per-request lines, so only use them for humans"""
+        if self.summary == "auto":
+            return self.stream.isatty()
+        return self.summary == "on"
+
+    def enqueue(self, text, droppable, request=False):
+        with self.lock:
+            if len(self.pending) >= self.max_queue:
+                if request:
+                    self.dropped_requests += 1
+                else:
+                    self.dropped += 1
+                return
+            self.pending.append((text, droppable))
+
+    def info(self, text):
+        """Queue a message that is shown even in summary mode"""
+        self.enqueue(text, False)
+
+    def count(self, host):
+        """Count a request for the summary view without showing it"""
+        with self.lock:
+            self.window_requests += 1
+            if host in self.window_hosts or len(self.window_hosts) < MAX_SUMMARY_HOSTS:
+                self.window_hosts[host] += 1
+
+    def request(self, text, host=None):
+        """Queue a request line and count it for the summary view (unless
+        host is None, for lines of requests that were counted earlier)"""
+        if host is not None:
+            self.count(host)
+        self.enqueue(text, True, request=True)
+
+    def detail(self, text):
+        """Queue per-flow details (e.g. response bodies), skipped in summary mode"""
+        self.enqueue(text, True)
+
+    def run(self):
+        """Writer thread: flush pending output every batch_interval"""
+        while not self.stopped.wait(self.batch_interval):
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        with self.lock:
+            batch = self.pending
+            self.pending = collections.deque()
+            dropped, self.dropped = self.dropped, 0
+            dropped_requests, self.dropped_requests = self.dropped_requests, 0
+
+            summary = None
+            now = time.monotonic()
+            elapsed = now - self.window_start
+            if elapsed >= 1.0:
+                rate = self.window_requests / elapsed
+                summary = (rate, self.window_hosts.most_common(5))
+                self.window_start = now
+                self.window_requests = 0
+                self.window_hosts = collections.Counter()
+
+        lines = []
+        if summary:
+            rate, top_hosts = summary
+            if self.summary_enabled() and rate > self.max_lines_per_sec:
+                self.summary_mode = True
+            elif rate < self.max_lines_per_sec / 2:
+                # Only switch back once the rate is clearly readable again
+                self.summary_mode = False
+
+            if self.summary_mode:
+                timestamp = datetime.datetime.now().strftime("%H:%M:%S")
+                hosts = ", ".join(f"{host} ({count})" for host, count in top_hosts)
+                lines.append(f"[{timestamp}] ·· {rate:.0f} requests/s, top hosts: {hosts}")
+
+        for text, droppable in batch:
+            if droppable and self.summary_mode:
+                continue
+            lines.append(text)
+
+        if dropped_requests:
+            # Parsed by proxy_ui, which adds the count to its request total
+            timestamp = datetime.datetime.now().strftime("%H:%M:%S")
+            lines.append(f"[{timestamp}] ·· console too slow, dropped {dropped_requests} requests")
+        if dropped:
+            lines.append(f"[!] Console too slow, dropped {dropped} lines")
+
+        if not lines:
+            return
+        try:
+            self.stream.write("\n".join(lines) + "\n")
+            self.stream.flush()
+        except (OSError, ValueError):
+            # Reader went away (closed pipe); nothing sensible left to do
+            pass
+
+    def close(self):
+        """Stop the writer thread after writing everything still queued"""
+        self.stopped.set()
+        self.thread.join(timeout=5)
+
+
+_renderer = None
+
+
+def get_renderer():
+    """Get the renderer shared by all addons in this process"""
+    global _renderer
+    if _renderer is None or _renderer.stopped.is_set():
+        _renderer = ConsoleRenderer()
+    return _renderer
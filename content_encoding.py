@@ -0,0 +1,84 @@
+"""
+Pre-compressed bodies for interceptor rules.
+
+Rules with `compress` get their body compressed once when the config is
+loaded. Each request then only picks the cached variant that best matches the
+client's Accept-Encoding header, so serving a compressed mock costs no more
+than serving the plain one.
+"""
+import gzip
+
+import brotli
+
+# Supported encodings, preferred first when the client likes them equally
+ENCODINGS = ["br", "gzip"]
+
+COMPRESSORS = {
+    "br": lambda body: brotli.compress(body, quality=11),
+    "gzip": lambda body: gzip.compress(body, compresslevel=9, mtime=0),
+}
+
+
+def rule_encodings(compress):
+    """Encodings requested by a rule's compress setting (true, a name or a list)"""
+    if compress is True:
+        return list(ENCODINGS)
+    if not compress:
+        return []
+    if isinstance(compress, str):
+        compress = [compress]
+    unknown = [name for name in compress if name not in COMPRESSORS]
+    if unknown:
+        raise ValueError(f"unsupported encoding(s): {', '.join(unknown)}")
+    return [name for name in ENCODINGS if name in compress]
+
+
+def compress_variants(body, encodings):
+    """Build {encoding: body} including identity, skipping variants that aren't smaller"""
+    variants = {"identity": body}
+    for name in encodings:
+        compressed = COMPRESSORS[name](body)
+        if len(compressed) < len(body):
+            variants[name] = compressed
+    return variants
+
+
+def parse_accept_encoding(header):
+    """Map each coding in an Accept-Encoding header to its q-value"""
+    accepted = {}
+    for item in header.split(","):
+        coding, *params = item.split(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def negotiate(accept_encoding, variants):
+    """Pick the variant for a request, returns (encoding, body)"""
+    if accept_encoding is None or len(variants) == 1:
+        return "identity", variants["identity"]
+
+    accepted = parse_accept_encoding(accept_encoding)
+    wildcard = accepted.get("*")
+
+    # Identity is always acceptable, but only preferred if the client says so
+    best, best_q = "identity", accepted.get("identity", 0.0)
+    for name in ENCODINGS:
+        if name not in variants:
+            continue
+        q = accepted.get(name, wildcard or 0.0)
+        if q > 0 and q >= best_q:
+            if q > best_q or best == "identity":
+                best, best_q = name, q
+    # Identity is sent even if the client refuses it and nothing else fits
+    return best, variants[best]
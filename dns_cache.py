@@ -0,0 +1,274 @@
+"""
+Caching DNS resolver for upstream connections.
+
+Every upstream connection mitmproxy (or upstream_pool.py) opens resolves the
+host name with the event loop's getaddrinfo, i.e. a fresh system lookup. This
+addon replaces that lookup with a cache:
+
+- entries expire after their DNS TTL and are capped by dns_cache_max_ttl.
+  The system resolver doesn't report TTLs, so with dnspython installed a miss
+  also queries the A/AAAA records for them (in parallel with the lookup);
+  without it every entry is kept for dns_cache_ttl
+- concurrent lookups for the same name share one query; only that query
+  counts as a miss, the callers waiting for it are counted as shared
+- names used at least twice are refreshed in the background shortly before
+  they expire, so popular hosts never wait for DNS
+- at most dns_cache_size entries are kept, least recently used are evicted
+- dns_override entries ("host=ip") answer without any lookup, e.g. to point
+  an upstream at a local stand-in while testing
+
+Enable it with ./proxy.sh --dns-cache. Hit rate and time saved per host are
+reported on shutdown.
+"""
+from mitmproxy import ctx, exceptions
+from collections.abc import Sequence
+import asyncio
+import collections
+import datetime
+import ipaddress
+import os
+import socket
+import time
+
+try:
+    import dns.asyncresolver
+    import dns.exception
+except ImportError:
+    dns = None
+
+# Refresh popular entries when less than this fraction of their TTL is left
+PREFETCH_FRACTION = 0.1
+
+
+class CacheEntry:
+    def __init__(self, result, ttl):
+        self.result = result
+        self.ttl = ttl
+        self.expires = time.monotonic() + ttl
+        self.hits = 0
+        self.refreshing = False
+
+
+class HostStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        # Callers that waited for another caller's query, they saved nothing
+        self.shared = 0
+        self.lookup_time = 0.0
+
+    @property
+    def lookups(self):
+        return self.hits + self.misses + self.shared
+
+    def time_saved(self):
+        """Estimated lookup time saved by cache hits"""
+        if not self.misses:
+            return 0.0
+        return self.hits * self.lookup_time / self.misses
+
+
+class DnsCache:
+    def __init__(self):
+        self.entries = collections.OrderedDict()
+        self.inflight = {}
+        self.overrides = {}
+        self.stats = collections.OrderedDict()
+        self.loop = None
+        self.original_getaddrinfo = None
+
+    def load(self, loader):
+        loader.add_option(
+            "dns_cache_size", int, 1024,
+            "Maximum number of cached DNS lookups"
+        )
+        loader.add_option(
+            "dns_cache_ttl", int, 60,
+            "Seconds to cache a lookup when the DNS TTL is unknown"
+        )
+        loader.add_option(
+            "dns_cache_max_ttl", int, 3600,
+            "Upper bound for the TTL of cached lookups"
+        )
+        loader.add_option(
+            "dns_override", Sequence[str], [],
+            "Static DNS answers as host=ip, e.g. api.example.com=127.0.0.1"
+        )
+
+    def configure(self, updated):
+        if "dns_override" in updated:
+            overrides = {}
+            for override in ctx.options.dns_override:
+                host, _, ip = override.partition("=")
+                host = host.strip().lower()
+                try:
+                    address = ipaddress.ip_address(ip.strip())
+                except ValueError:
+                    address = None
+                if not host or address is None:
+                    raise exceptions.OptionsError(
+                        f"Invalid dns_override '{override}', expected host=ip (e.g. api.example.com=127.0.0.1)"
+                    )
+                overrides[host] = address
+            self.overrides = overrides
+
+    def running(self):
+        if dns is None:
+            print(
+                f"[!] dnspython is not installed, DNS TTLs are unknown and every entry is "
+                f"cached for {ctx.options.dns_cache_ttl}s (pip install dnspython)"
+            )
+        # Every upstream connection on this loop resolves through the cache
+        self.loop = asyncio.get_event_loop()
+        self.original_getaddrinfo = self.loop.getaddrinfo
+        self.loop.getaddrinfo = self.getaddrinfo
+
+    def done(self):
+        if self.loop is not None:
+            self.loop.getaddrinfo = self.original_getaddrinfo
+            self.loop = None
+        self.report()
+
+    def host_stats(self, host):
+        stats = self.stats.get(host)
+        if stats is None:
+            stats = self.stats[host] = HostStats()
+            if len(self.stats) > ctx.options.dns_cache_size:
+                self.stats.popitem(last=False)
+        return stats
+
+    async def getaddrinfo(self, host, port, *, family=0, type=0, proto=0, flags=0):
+        if isinstance(host, bytes):
+            host = host.decode("idna")
+        name = host.lower() if host else host
+
+        if name in self.overrides:
+            return self.override_result(self.overrides[name], port, type, proto)
+
+        key = (name, port, family, type, proto, flags)
+        entry = self.entries.get(key)
+        if entry is not None and entry.expires > time.monotonic():
+            self.entries.move_to_end(key)
+            entry.hits += 1
+            self.host_stats(name).hits += 1
+            if (
+                entry.hits >= 2
+                and not entry.refreshing
+                and entry.expires - time.monotonic() < entry.ttl * PREFETCH_FRACTION
+            ):
+                entry.refreshing = True
+                asyncio.ensure_future(self.refresh(key))
+            return entry.result
+
+        start = time.perf_counter()
+        result, leader = await self.lookup(key)
+        stats = self.host_stats(name)
+        if leader:
+            stats.misses += 1
+            stats.lookup_time += time.perf_counter() - start
+        else:
+            # Waited for another caller's query, no lookup of its own
+            stats.shared += 1
+        return result
+
+    async def lookup(self, key):
+        """Resolve a key, sharing the query with concurrent callers.
+        Returns the result and whether this caller started the query."""
+        task = self.inflight.get(key)
+        leader = task is None
+        if leader:
+            task = self.inflight[key] = asyncio.ensure_future(self.resolve(key))
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        return await asyncio.shield(task), leader
+
+    async def refresh(self, key):
+        """Prefetch an entry that is about to expire"""
+        try:
+            await self.lookup(key)
+        except OSError:
+            # Keep serving the old answer until it expires
+            entry = self.entries.get(key)
+            if entry is not None:
+                entry.refreshing = False
+
+    async def resolve(self, key):
+        name, port, family, type, proto, flags = key
+        lookup = self.original_getaddrinfo(name, port, family=family, type=type, proto=proto, flags=flags)
+        if dns is None or self.is_address(name):
+            result = await lookup
+            ttl = None
+        else:
+            # Only the record types the lookup can return
+            rdtypes = {socket.AF_INET: ["A"], socket.AF_INET6: ["AAAA"]}.get(family, ["A", "AAAA"])
+            result, *ttls = await asyncio.gather(lookup, *(self.dns_ttl(name, rdtype) for rdtype in rdtypes))
+            ttls = dict(zip(rdtypes, ttls))
+            # The entry expires with the shortest TTL of the record types it holds
+            returned = {"A" if info[0] == socket.AF_INET else "AAAA" for info in result}
+            known = [ttls[rdtype] for rdtype in returned if ttls.get(rdtype) is not None]
+            ttl = min(known) if known else None
+
+        ttl = ttl if ttl is not None else ctx.options.dns_cache_ttl
+        ttl = min(ttl, ctx.options.dns_cache_max_ttl)
+        if ttl > 0:
+            self.entries[key] = CacheEntry(result, ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > ctx.options.dns_cache_size:
+                self.entries.popitem(last=False)
+        return result
+
+    async def dns_ttl(self, name, rdtype):
+        """TTL of the name's A or AAAA records, None if it can't be determined"""
+        try:
+            answer = await dns.asyncresolver.resolve(name, rdtype)
+            return answer.rrset.ttl
+        except (dns.exception.DNSException, OSError):
+            return None
+
+    def is_address(self, name):
+        """IP literals (and "localhost") have no records worth querying"""
+        if not name or name == "localhost":
+            return True
+        try:
+            ipaddress.ip_address(name)
+            return True
+        except ValueError:
+            return False
+
+    def override_result(self, address, port, type, proto):
+        """Build a getaddrinfo() style answer for a static override"""
+        ip = str(address)
+        family = socket.AF_INET6 if address.version == 6 else socket.AF_INET
+        sockaddr = (ip, port or 0, 0, 0) if family == socket.AF_INET6 else (ip, port or 0)
+        return [(family, type or socket.SOCK_STREAM, proto or socket.IPPROTO_TCP, "", sockaddr)]
+
+    def report(self):
+        """Print and log cache hit rate and time saved per host"""
+        hits = sum(s.hits for s in self.stats.values())
+        shared = sum(s.shared for s in self.stats.values())
+        lookups = sum(s.lookups for s in self.stats.values())
+        if not lookups:
+            return
+
+        saved = sum(s.time_saved() for s in self.stats.values())
+        summary = (
+            f"DNS cache: {hits}/{lookups} lookups answered from cache "
+            f"({hits / lookups:.0%} hit rate), {shared} shared a pending query, "
+            f"~{saved * 1000:.0f} ms lookup time saved"
+        )
+        top = sorted(self.stats.items(), key=lambda item: item[1].time_saved(), reverse=True)[:10]
+        details = [
+            f"    {host}: {s.hits}/{s.lookups} hits, {s.shared} shared, ~{s.time_saved() * 1000:.0f} ms saved"
+            for host, s in top
+        ]
+
+        print(f"\n[+] {summary}")
+        print("\n".join(details))
+
+        os.makedirs("logs", exist_ok=True)
+        with open("logs/url_log.txt", "a") as f:
+            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            f.write(f"\n[{timestamp}] {summary}\n")
+            f.write("\n".join(details) + "\n")
+
+# Configure mitmproxy to use our addon
+addons = [DnsCache()]
@@ -0,0 +1,212 @@
+"""
+File-backed bodies for interceptor rules.
+
+mitmproxy can only attach a complete body to a response it creates itself, so
+a rule with `file:` would otherwise read the whole file into memory for every
+request. Instead, url_interceptor.py points such requests at a small HTTP
+server on 127.0.0.1 that serves the file with sendfile() (zero-copy, in
+chunks), and mitmproxy streams that response through to the client. Memory
+use stays flat no matter how many large downloads run concurrently.
+
+The server answers:
+
+- Range requests (single range) with 206, or 416 if unsatisfiable
+- If-None-Match with 304, If-Range falls back to the full body
+- HEAD without a body
+
+ETag, Last-Modified and Content-Length are computed once per file version and
+only recomputed when the file's size or modification time changes.
+"""
+import asyncio
+import email.utils
+import http
+import mimetypes
+import os
+import re
+
+import h11
+
+# Largest request head accepted by the file server
+MAX_REQUEST_SIZE = 65536
+
+RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+class FileBody:
+    def __init__(self, path, status=200, headers=None):
+        self.path = path
+        self.status = status
+        self.headers = dict(headers or {})
+        if not any(name.lower() == "content-type" for name in self.headers):
+            self.headers["Content-Type"] = mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+        # Validators of the file version last seen
+        self.version = None
+        self.size = 0
+        self.etag = None
+        self.last_modified = None
+
+    def refresh(self, stat):
+        """Recompute validators if the file changed since the last request"""
+        version = (stat.st_size, stat.st_mtime_ns)
+        if version != self.version:
+            self.version = version
+            self.size = stat.st_size
+            self.etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+            self.last_modified = email.utils.formatdate(stat.st_mtime, usegmt=True)
+
+    def not_modified(self, if_none_match):
+        """Check an If-None-Match header against the current ETag"""
+        if if_none_match is None:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or any(tag.removeprefix("W/") == self.etag for tag in tags)
+
+    def byte_range(self, range_header, if_range):
+        """Return (start, end) of a satisfiable range, "unsatisfiable" or None for the full body"""
+        if range_header is None or self.status != 200:
+            return None
+        if if_range is not None and if_range.strip() != self.etag:
+            return None
+
+        # Multiple ranges are answered with the full body, which is allowed
+        match = RANGE_PATTERN.match(range_header.strip())
+        if not match or match.group(1) == match.group(2) == "":
+            return None
+
+        first, last = match.groups()
+        if first == "":
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length == 0 or self.size == 0:
+                return "unsatisfiable"
+            return max(self.size - length, 0), self.size - 1
+
+        start = int(first)
+        end = int(last) if last else self.size - 1
+        if last and end < start:
+            return None
+        if start >= self.size:
+            return "unsatisfiable"
+        return start, min(end, self.size - 1)
+
+
+class FileServer:
+    def __init__(self):
+        # File bodies by the path they are served under
+        self.bodies = {}
+        self.server = None
+        self.port = None
+
+        # Statistics
+        self.served = 0
+        self.bytes_sent = 0
+
+    def register(self, path, status=200, headers=None):
+        """Add a file body, return the path it is served under"""
+        route = f"/{len(self.bodies)}"
+        body = self.bodies[route] = FileBody(path, status, {k: str(v) for k, v in (headers or {}).items()})
+        try:
+            body.refresh(os.stat(path))
+        except OSError:
+            # Answered with 404 until the file exists
+            pass
+        return route
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+            self.port = None
+
+    async def read_request(self, reader):
+        """Read one request with h11, discarding any request body"""
+        conn = h11.Connection(h11.SERVER, max_incomplete_event_size=MAX_REQUEST_SIZE)
+        request = None
+        while True:
+            event = conn.next_event()
+            if event is h11.NEED_DATA:
+                data = await reader.read(65536)
+                if not data:
+                    return None
+                conn.receive_data(data)
+            elif isinstance(event, h11.Request):
+                request = event
+            elif isinstance(event, h11.EndOfMessage):
+                return request
+
+    async def handle(self, reader, writer):
+        try:
+            try:
+                request = await self.read_request(reader)
+            except h11.RemoteProtocolError:
+                request = None
+            if request is not None:
+                await self.respond(request, writer)
+        except (OSError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, request, writer):
+        headers = {name.decode().lower(): value.decode("latin-1") for name, value in request.headers}
+        body = self.bodies.get(request.target.decode().split("?", 1)[0])
+
+        try:
+            f = open(body.path, "rb") if body else None
+        except OSError:
+            f = None
+        if f is None:
+            message = b"File not found"
+            self.write_head(writer, 404, {"Content-Type": "text/plain", "Content-Length": str(len(message))})
+            writer.write(message)
+            await writer.drain()
+            return
+
+        with f:
+            body.refresh(os.fstat(f.fileno()))
+            response_headers = dict(body.headers)
+            response_headers.update({
+                "ETag": body.etag,
+                "Last-Modified": body.last_modified,
+            })
+            if body.status == 200:
+                response_headers["Accept-Ranges"] = "bytes"
+
+            status, start, length = body.status, 0, body.size
+            if body.status == 200 and request.method in (b"GET", b"HEAD") and body.not_modified(headers.get("if-none-match")):
+                status, length = 304, 0
+            elif request.method == b"GET":
+                byte_range = body.byte_range(headers.get("range"), headers.get("if-range"))
+                if byte_range == "unsatisfiable":
+                    status, length = 416, 0
+                    response_headers["Content-Range"] = f"bytes */{body.size}"
+                elif byte_range is not None:
+                    start, end = byte_range
+                    status, length = 206, end - start + 1
+                    response_headers["Content-Range"] = f"bytes {start}-{end}/{body.size}"
+
+            if status != 304:
+                response_headers["Content-Length"] = str(length)
+            self.write_head(writer, status, response_headers)
+            await writer.drain()
+
+            if request.method != b"HEAD" and length:
+                loop = asyncio.get_running_loop()
+                self.bytes_sent += await loop.sendfile(writer.transport, f, start, length)
+            self.served += 1
+
+    def write_head(self, writer, status, headers):
+        try:
+            reason = http.HTTPStatus(status).phrase
+        except ValueError:
+            reason = ""
+        lines = [f"HTTP/1.1 {status} {reason}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        lines.append("Connection: close")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
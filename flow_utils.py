@@ -0,0 +1,85 @@
+"""Helpers shared by the URL logging addons"""
+import os
+
+
+def split_authority(authority):
+    """Split an authority ("host", "host:port", "[v6]:port") into host and port"""
+    if authority.startswith("["):
+        # IPv6 literal, e.g. [::1]:8443
+        host, _, rest = authority[1:].partition("]")
+        port = rest[1:] if rest.startswith(":") else ""
+    elif authority.count(":") == 1:
+        host, _, port = authority.partition(":")
+    else:
+        host, port = authority, ""
+    return host.lower(), port
+
+
+def request_authority(request):
+    """Get the authority a client asked for.
+
+    HTTP/2 and HTTP/3 requests carry it in the :authority pseudo-header and
+    usually have no Host header at all, HTTP/1.x requests use the Host header.
+    Fall back to the connection target when neither is present.
+    """
+    if request.is_http2 or request.is_http3:
+        authority = request.authority or request.headers.get("Host", "")
+    else:
+        authority = request.headers.get("Host", "") or request.authority
+
+    if not authority:
+        authority = request.host
+        if ":" in authority:
+            # IPv6 literal, bracketed so the port can't be read as part of it
+            authority = f"[{authority}]"
+        if request.port not in (80, 443):
+            authority = f"{authority}:{request.port}"
+    return authority
+
+
+def request_host(request):
+    """Get the host name a client asked for, without port"""
+    return split_authority(request_authority(request))[0]
+
+
+def full_url(request):
+    """Build the complete URL of a request, for HTTP/1.1 and HTTP/2 alike"""
+    # CONNECT requests only have an authority
+    if request.method == "CONNECT":
+        return request_authority(request)
+
+    host, port = split_authority(request_authority(request))
+    if ":" in host:
+        host = f"[{host}]"
+
+    scheme = request.scheme
+    if port and not (scheme == "https" and port == "443") and not (scheme == "http" and port == "80"):
+        host = f"{host}:{port}"
+
+    path = request.path
+    if not path.startswith("/"):
+        path = "/" + path
+
+    return f"{scheme}://{host}{path}"
+
+
+def load_domain_list(path):
+    """Load a domain list file (one domain per line, # starts a comment)"""
+    domains = []
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            for line in f:
+                line = line.split('#')[0].strip()
+                if line:
+                    domains.append(line.lower())
+    return domains
+
+
+def match_domain(host, domains):
+    """Return the entry of `domains` (a set) matching host or one of its parents"""
+    host = host.lower().rstrip(".")
+    while host:
+        if host in domains:
+            return host
+        host = host.partition(".")[2]
+    return None
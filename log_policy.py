@@ -0,0 +1,183 @@
+"""
+Logging policy for the URL addons.
+
+Decides per flow whether it is written to the console and the log file, so a
+single chatty host can't dominate the log. Configured in logging.config.yaml:
+
+    default:            # applies to every host without its own entry
+      rate: 0           # token bucket refill, flows/second (0 = unlimited)
+      burst: 10         # token bucket size
+      sample: 1.0       # probability of logging a flow
+      reservoir: 0      # log at most N flows per window (0 = off)
+      window: 10        # reservoir window in seconds
+    hosts:              # per-host overrides, also match subdomains
+      telemetry.example.com:
+        rate: 1
+    always_log:
+      errors: true      # responses >= 400 and connection errors
+      intercepted: true # flows answered by the interceptor
+    report_interval: 10 # seconds between "skipped" summaries
+
+Skipped flows are counted exactly and reported periodically, so totals stay
+correct even when most flows are not logged.
+"""
+import collections
+import os
+import random
+import time
+
+import yaml
+
+from flow_utils import match_domain
+from token_bucket import TokenBucket
+
+# Maximum number of hosts with their own bucket/reservoir state
+MAX_TRACKED_HOSTS = 10000
+
+DEFAULT_RULE = {
+    "rate": 0,
+    "burst": 10,
+    "sample": 1.0,
+    "reservoir": 0,
+    "window": 10,
+}
+
+
+class Reservoir:
+    """Keeps at most N flows per window. Flows are sampled with probability
+    N / (flows seen in the previous window), so with steady traffic the kept
+    flows are spread over the window instead of being its first N."""
+
+    def __init__(self, size, window):
+        self.size = size
+        self.window = window
+        self.started = time.monotonic()
+        self.seen = 0
+        self.kept = 0
+        self.expected = 0
+
+    def keep(self):
+        now = time.monotonic()
+        if now - self.started >= self.window:
+            self.started = now
+            self.expected = self.seen
+            self.seen = 0
+            self.kept = 0
+        self.seen += 1
+        if self.kept >= self.size:
+            return False
+        if self.expected > self.size and random.random() >= self.size / self.expected:
+            return False
+        self.kept += 1
+        return True
+
+
+class LogPolicy:
+    def __init__(self, config_file="logging.config.yaml"):
+        self.config_file = config_file
+        self.default_rule = dict(DEFAULT_RULE)
+        self.host_rules = {}
+        self.always_log_errors = True
+        self.always_log_intercepted = True
+        self.report_interval = 10
+
+        # Per-host limiter state, least recently used first
+        self.buckets = collections.OrderedDict()
+        self.reservoirs = collections.OrderedDict()
+
+        # Exact counts, the per-host ones reset after every report
+        self.total_seen = 0
+        self.total_skipped = 0
+        self.skipped_by_host = collections.Counter()
+        self.last_report = time.monotonic()
+
+        self.enabled = False
+        self.load_config()
+
+    def load_config(self):
+        """Load the logging policy from YAML file"""
+        if not os.path.exists(self.config_file):
+            return
+
+        try:
+            with open(self.config_file, "r") as f:
+                config = yaml.safe_load(f) or {}
+        except Exception as e:
+            print(f"[!] Error loading logging policy: {str(e)}")
+            return
+
+        self.default_rule.update(config.get("default") or {})
+        for host, rule in (config.get("hosts") or {}).items():
+            self.host_rules[host.lower()] = {**self.default_rule, **(rule or {})}
+
+        always_log = config.get("always_log") or {}
+        self.always_log_errors = always_log.get("errors", True)
+        self.always_log_intercepted = always_log.get("intercepted", True)
+        self.report_interval = config.get("report_interval", 10)
+
+        self.enabled = bool(self.host_rules) or self.default_rule != DEFAULT_RULE
+
+    def rule_for(self, host):
+        domain = match_domain(host, self.host_rules)
+        if domain:
+            return domain, self.host_rules[domain]
+        return None, self.default_rule
+
+    def tracked(self, states, key, factory):
+        """Get per-host state from a bounded LRU"""
+        state = states.get(key)
+        if state is None:
+            state = states[key] = factory()
+            if len(states) > MAX_TRACKED_HOSTS:
+                states.popitem(last=False)
+        else:
+            states.move_to_end(key)
+        return state
+
+    def should_log(self, host, always=False):
+        """Decide whether a new flow to host is logged"""
+        self.total_seen += 1
+        if always or not self.enabled:
+            return True
+
+        domain, rule = self.rule_for(host)
+        # Hosts without their own rule share limits per host, not globally
+        key = domain or host
+
+        if rule["sample"] < 1.0 and random.random() >= rule["sample"]:
+            return False
+        if rule["reservoir"]:
+            reservoir = self.tracked(self.reservoirs, key, lambda: Reservoir(rule["reservoir"], rule["window"]))
+            if not reservoir.keep():
+                return False
+        if rule["rate"]:
+            bucket = self.tracked(self.buckets, key, lambda: TokenBucket(rule["rate"], rule["burst"]))
+            if not bucket.take():
+                return False
+        return True
+
+    def is_error(self, flow):
+        """Check if a flow falls under the always-log rule for errors"""
+        if not self.always_log_errors:
+            return False
+        return flow.error is not None or (flow.response is not None and flow.response.status_code >= 400)
+
+    def skipped(self, host):
+        """Count a flow that was not logged"""
+        self.total_skipped += 1
+        self.skipped_by_host[host] += 1
+
+    def report(self, force=False):
+        """Return a summary line of skipped flows once per report interval"""
+        now = time.monotonic()
+        if not force and now - self.last_report < self.report_interval:
+            return None
+        self.last_report = now
+
+        if not self.skipped_by_host:
+            return None
+
+        count = sum(self.skipped_by_host.values())
+        top = ", ".join(f"{host}: {n}" for host, n in self.skipped_by_host.most_common(5))
+        self.skipped_by_host = collections.Counter()
+        return f"skipped {count} requests ({top})"
@@ -0,0 +1,56 @@
+from mitmproxy import tls
+import os
+import datetime
+
+from flow_utils import load_domain_list, match_domain
+
+class BlacklistPassthrough:
+    """Tunnel TLS connections to blacklisted domains without decrypting them"""
+
+    def __init__(self):
+        os.makedirs("logs", exist_ok=True)
+        self.log_file = "logs/url_log.txt"
+
+        # Domains from domain_blacklist.txt, matched including subdomains
+        self.blacklisted_domains = set(load_domain_list("domain_blacklist.txt"))
+
+        # Connections passed through, in total and per blacklist entry
+        self.passed_through = 0
+        self.passed_through_by_domain = {}
+
+        if self.blacklisted_domains:
+            print(f"[+] Passing through TLS for {len(self.blacklisted_domains)} blacklisted domains without interception")
+
+    def tls_clienthello(self, data: tls.ClientHelloData):
+        """Decide at connection time whether to intercept this TLS connection"""
+        # Prefer SNI, fall back to the CONNECT target
+        host = data.client_hello.sni
+        if not host and data.context.server.address:
+            host = data.context.server.address[0]
+        if not host:
+            return
+
+        domain = match_domain(host, self.blacklisted_domains)
+        if domain:
+            data.ignore_connection = True
+            self.passed_through += 1
+            self.passed_through_by_domain[domain] = self.passed_through_by_domain.get(domain, 0) + 1
+
+    def done(self):
+        """Report how many connections were tunneled untouched"""
+        if not self.passed_through:
+            return
+
+        top = sorted(self.passed_through_by_domain.items(), key=lambda item: item[1], reverse=True)
+        summary = f"Passed through {self.passed_through} blacklisted connections without interception"
+        details = ", ".join(f"{domain}: {count}" for domain, count in top[:10])
+
+        print(f"\n[+] {summary}")
+        print(f"    {details}")
+
+        with open(self.log_file, "a") as f:
+            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            f.write(f"\n[{timestamp}] {summary}\n    {details}\n")
+
+# Configure mitmproxy to use our addon
+addons = [BlacklistPassthrough()]
@@ -8,6 +8,10 @@ WORK_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 VENV_DIR="$WORK_DIR/venv"
 PROXY_PORT=4545
 PROXY_HOST=127.0.0.1
+# HTTP/2 is enabled by default; --http1 sets this to --no-http2
+HTTP2_FLAG=""
+# Extra mitmproxy addon scripts and options enabled by command line flags
+ADDON_ARGS=()
 
 # Function to check if a port is in use
 check_port() {
@@ -81,6 +85,17 @@ show_usage() {
     echo "  -p, --port PORT  - Specify the port to use (default: 4545)"
     echo "  -a, --auto       - Automatically find an available port if default is in use"
     echo "  -v, --verbose    - Show detailed output (for 'live' mode)"
+    echo "  --http1          - Disable HTTP/2 and force HTTP/1.1 on both sides"
+    echo "  --passthrough    - Tunnel TLS to blacklisted domains without interception"
+    echo "  --pool           - Reuse upstream keep-alive connections across clients"
+    echo "  --pool-max-idle N          - Idle pooled connections per upstream (default: 8)"
+    echo "  --pool-max-per-host N      - Concurrent pooled connections per upstream (default: 32)"
+    echo "  --pool-idle-timeout SECS   - Close idle pooled connections after SECS (default: 30)"
+    echo "  --dns-cache      - Cache upstream DNS lookups (TTL-aware, with prefetch)"
+    echo "  --dns-override HOST=IP     - Resolve HOST to IP (enables --dns-cache, repeatable)"
+    echo "  --clients        - Account traffic per client and show the top clients"
+    echo "  --client-rps N             - Pace clients above N requests/second (enables --clients)"
+    echo "  --client-kbps N            - Pace clients above N KB/s of responses (enables --clients)"
     echo ""
     echo "Examples:"
     echo "  ./proxy.sh start"
@@ -161,8 +176,7 @@ start_proxy() {
     
     # Start mitmproxy in background
     echo "[*] Starting mitmproxy..."
-    # Use --no-http2 to prevent URL truncation in HTTP/2 traffic
-    mitmdump -v --showhost --flow-detail 3 --listen-port $PROXY_PORT --no-http2 > logs/proxy.log 2>&1 &
+    mitmdump -v --showhost --flow-detail 3 --listen-port $PROXY_PORT $HTTP2_FLAG "${ADDON_ARGS[@]}" > logs/proxy.log 2>&1 &
     PROXY_PID=$!
     echo $PROXY_PID > logs/proxy.pid
     
@@ -203,8 +217,7 @@ start_proxy_live() {
     trap 'echo ""; echo "[*] Interrupted by user"; restore_proxy; exit 0' INT
     
     # Start mitmproxy in foreground
-    # Use --no-http2 to prevent URL truncation in HTTP/2 traffic
-    mitmdump -v --showhost --flow-detail 3 --listen-port $PROXY_PORT --no-http2
+    mitmdump -v --showhost --flow-detail 3 --listen-port $PROXY_PORT $HTTP2_FLAG "${ADDON_ARGS[@]}"
     
     # This will only execute if mitmproxy exits normally
     restore_proxy
@@ -236,10 +249,10 @@ start_proxy_minimal() {
     # Check if interceptor config exists to decide which script to use
     if [ -f "$WORK_DIR/interceptor.config.yaml" ] && [ -s "$WORK_DIR/interceptor.config.yaml" ]; then
         # Use interceptor script if config exists and is not empty
-        mitmdump --listen-port $PROXY_PORT -s "$WORK_DIR/url_interceptor.py" -q
+        mitmdump --listen-port $PROXY_PORT $HTTP2_FLAG -s "$WORK_DIR/url_interceptor.py" "${ADDON_ARGS[@]}" -q
     else
         # Use simple URL only script
-        mitmdump --listen-port $PROXY_PORT -s "$WORK_DIR/url_only.py" -q
+        mitmdump --listen-port $PROXY_PORT $HTTP2_FLAG -s "$WORK_DIR/url_only.py" "${ADDON_ARGS[@]}" -q
     fi
     
     # This will only execute if mitmproxy exits normally
@@ -250,6 +263,8 @@ start_proxy_minimal() {
 COMMAND=""
 AUTO_PORT=true  # Auto port detection is now on by default
 VERBOSE=false
+DNS_CACHE=false
+CLIENT_ACCOUNTING=false
 
 while [[ $# -gt 0 ]]; do
     case "$1" in
@@ -273,6 +288,54 @@ while [[ $# -gt 0 ]]; do
             VERBOSE=true
             shift
             ;;
+        --http1)
+            HTTP2_FLAG="--no-http2"
+            shift
+            ;;
+        --passthrough)
+            ADDON_ARGS+=(-s "$WORK_DIR/passthrough.py")
+            shift
+            ;;
+        --pool)
+            # Connect upstream only when needed, so pooled requests don't open a connection of their own
+            ADDON_ARGS+=(-s "$WORK_DIR/upstream_pool.py" --set connection_strategy=lazy)
+            shift
+            ;;
+        --pool-max-idle)
+            ADDON_ARGS+=(--set "upstream_pool_max_idle=$2")
+            shift 2
+            ;;
+        --pool-max-per-host)
+            ADDON_ARGS+=(--set "upstream_pool_max_per_host=$2")
+            shift 2
+            ;;
+        --pool-idle-timeout)
+            ADDON_ARGS+=(--set "upstream_pool_idle_timeout=$2")
+            shift 2
+            ;;
+        --dns-cache)
+            DNS_CACHE=true
+            shift
+            ;;
+        --dns-override)
+            DNS_CACHE=true
+            ADDON_ARGS+=(--set "dns_override=$2")
+            shift 2
+            ;;
+        --clients)
+            CLIENT_ACCOUNTING=true
+            shift
+            ;;
+        --client-rps)
+            CLIENT_ACCOUNTING=true
+            ADDON_ARGS+=(--set "client_limit_rps=$2")
+            shift 2
+            ;;
+        --client-kbps)
+            CLIENT_ACCOUNTING=true
+            ADDON_ARGS+=(--set "client_limit_kbps=$2")
+            shift 2
+            ;;
         *)
             echo "Error: Unknown option '$1'"
             show_usage
@@ -280,6 +343,17 @@ while [[ $# -gt 0 ]]; do
     esac
 done
 
+# Load the DNS cache once, however many DNS options were given
+if [ "$DNS_CACHE" = true ]; then
+    ADDON_ARGS+=(-s "$WORK_DIR/dns_cache.py")
+fi
+
+# Same for per-client accounting and its limits, loaded ahead of the other
+# addons so throttled flows wait before anything is sent upstream
+if [ "$CLIENT_ACCOUNTING" = true ]; then
+    ADDON_ARGS=(-s "$WORK_DIR/client_accounting.py" "${ADDON_ARGS[@]}")
+fi
+
 # Check if a command was provided
 if [ -z "$COMMAND" ]; then
     # Default to 'live' mode if no command is provided
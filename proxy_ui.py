@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 import os
 import sys
+import argparse
 import json
 import yaml
 import subprocess
@@ -20,12 +21,24 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
-socketio = SocketIO(app, cors_allowed_origins="*")
+
+# The async mode is chosen by serve_ui.py for production (gevent/eventlet);
+# a message queue (e.g. redis://) lets several server processes share clients
+socketio = SocketIO(
+    app,
+    cors_allowed_origins="*",
+    async_mode=os.environ.get('PROXY_UI_ASYNC_MODE', 'threading'),
+    message_queue=os.environ.get('PROXY_UI_MESSAGE_QUEUE') or None
+)
+
+# Minimum seconds between proxy_state broadcasts while requests stream in
+STATE_EMIT_INTERVAL = 0.5
 
 # Global state
 proxy_process = None
 proxy_thread = None
 request_queue = queue.Queue()
+top_clients = []
 proxy_state = {
     'running': False,
     'port': 4545,
@@ -46,6 +59,10 @@ def emit_request(request_data):
     """Emit a new request to all connected clients"""
     socketio.emit('new_request', request_data)
 
+def emit_top_clients():
+    """Emit the busiest proxy clients to all connected clients"""
+    socketio.emit('top_clients', top_clients)
+
 def read_config_file(filename):
     """Read a configuration file"""
     filepath = os.path.join(WORK_DIR, filename)
@@ -92,6 +109,46 @@ def parse_request_line(line):
                     'content_type': response_part.split(status, 1)[1].strip() if status in response_part else ''
                 }
         
+        # Summary of flows skipped by the logging policy: [12:34:56] ·· skipped 12 requests (...)
+        skipped_match = re.match(r'\[(\d{2}:\d{2}:\d{2})\]\s+·· skipped (\d+) requests', line)
+        if skipped_match:
+            return {
+                'type': 'skipped',
+                'timestamp': skipped_match.group(1),
+                'count': int(skipped_match.group(2))
+            }
+        
+        # Request lines the addon's console dropped: [12:34:56] ·· console too slow, dropped 12 requests
+        dropped_match = re.match(r'\[(\d{2}:\d{2}:\d{2})\]\s+·· console too slow, dropped (\d+) requests', line)
+        if dropped_match:
+            return {
+                'type': 'dropped',
+                'timestamp': dropped_match.group(1),
+                'count': int(dropped_match.group(2))
+            }
+        
+        # Busiest proxy clients: [12:34:56] ·· top clients: 10.0.0.5 (812 requests, 41.2 MB, 6 connections); ...
+        clients_match = re.match(r'\[(\d{2}:\d{2}:\d{2})\]\s+·· top clients: (.+)$', line)
+        if clients_match:
+            clients = []
+            for entry in re.finditer(
+                r'(\S+) \((\d+) requests, ([^,]+), (\d+) connections(?:, (\d+) throttled)?\)',
+                clients_match.group(2)
+            ):
+                address, requests, traffic, connections, throttled = entry.groups()
+                clients.append({
+                    'address': address,
+                    'requests': int(requests),
+                    'traffic': traffic,
+                    'connections': int(connections),
+                    'throttled': int(throttled or 0)
+                })
+            return {
+                'type': 'clients',
+                'timestamp': clients_match.group(1),
+                'clients': clients
+            }
+        
         # Parse request lines
         match = re.match(r'\[(\d{2}:\d{2}:\d{2})\]\s+(\w+)\s+(.+?)(?:\s+\[(.+?)\])?$', line)
         if match:
@@ -117,7 +174,7 @@ def parse_request_line(line):
 
 def monitor_proxy_output():
     """Monitor proxy output and emit requests via WebSocket"""
-    global proxy_process, proxy_state
+    global proxy_process, proxy_state, top_clients
     
     while proxy_state['running'] and proxy_process:
         try:
@@ -131,17 +188,34 @@ def monitor_proxy_output():
                 
                 # Parse the request line
                 request_data = parse_request_line(line)
-                if request_data:
+                if request_data and request_data['type'] in ('skipped', 'dropped'):
+                    # Not shown individually, but still part of the totals
+                    proxy_state['requests_count'] += request_data['count']
+                elif request_data and request_data['type'] == 'clients':
+                    top_clients = request_data['clients']
+                    emit_top_clients()
+                elif request_data:
                     proxy_state['requests_count'] += 1
                     emit_request(request_data)
-                    emit_proxy_state()
                     
         except Exception as e:
             logger.error(f"Error monitoring proxy: {e}")
             break
     
+    emit_proxy_state()
     logger.info("Proxy monitoring stopped")
 
+def emit_state_changes():
+    """Emit proxy_state whenever the request count changed, a few times a second"""
+    # Every client gets each request, but the counter only needs to refresh
+    # a few times a second; this also sends the final count after a burst
+    last_count = None
+    while proxy_state['running']:
+        if proxy_state['requests_count'] != last_count:
+            last_count = proxy_state['requests_count']
+            emit_proxy_state()
+        socketio.sleep(STATE_EMIT_INTERVAL)
+
 @app.route('/')
 def index():
     """Serve the main UI"""
@@ -157,10 +231,15 @@ def get_proxy_state():
     """Get current proxy state"""
     return jsonify(proxy_state)
 
+@app.route('/api/proxy/clients')
+def get_top_clients():
+    """Get the busiest proxy clients"""
+    return jsonify(top_clients)
+
 @app.route('/api/proxy/start', methods=['POST'])
 def start_proxy():
     """Start the proxy"""
-    global proxy_process, proxy_thread, proxy_state
+    global proxy_process, proxy_thread, proxy_state, top_clients
     
     if proxy_state['running']:
         return jsonify({'error': 'Proxy is already running'}), 400
@@ -171,7 +250,8 @@ def start_proxy():
     
     try:
         # Build command based on mode
-        cmd = [os.path.join(WORK_DIR, 'proxy.sh'), 'live', '--port', str(port)]
+        # --clients reports the busiest clients for the dashboard
+        cmd = [os.path.join(WORK_DIR, 'proxy.sh'), 'live', '--port', str(port), '--clients']
         if mode == 'verbose':
             cmd.append('--verbose')
         
@@ -190,10 +270,11 @@ def start_proxy():
         proxy_state['mode'] = mode
         proxy_state['start_time'] = datetime.now().isoformat()
         proxy_state['requests_count'] = 0
+        top_clients = []
         
-        # Start monitoring thread
-        proxy_thread = threading.Thread(target=monitor_proxy_output, daemon=True)
-        proxy_thread.start()
+        # Start monitoring (a thread, or a greenlet in production mode)
+        proxy_thread = socketio.start_background_task(monitor_proxy_output)
+        socketio.start_background_task(emit_state_changes)
         
         emit_proxy_state()
         return jsonify({'status': 'started', 'port': port})
@@ -289,6 +370,29 @@ def clear_logs():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+if os.environ.get('PROXY_UI_LOADTEST'):
+    @app.route('/api/debug/emit', methods=['POST'])
+    def debug_emit():
+        """Broadcast synthetic requests; only enabled for bench/loadtest_ui.py"""
+        data = request.json or {}
+        count = int(data.get('count', 1))
+        
+        for i in range(count):
+            timestamp = datetime.now().strftime("%H:%M:%S")
+            emit_request({
+                'type': 'request',
+                'timestamp': timestamp,
+                'method': 'GET',
+                'url': f'https://loadtest.example.com/item/{i}',
+                'host': 'loadtest.example.com',
+                'path': f'/item/{i}',
+                'app': 'Loadtest',
+                'id': f"{timestamp}_GET_loadtest_{i}",
+                'sent_at': time.time()
+            })
+        
+        return jsonify({'status': 'emitted', 'count': count})
+
 @socketio.on('connect')
 def handle_connect():
     """Handle client connection"""
@@ -318,7 +422,8 @@ def signal_handler(signum, frame):
     cleanup()
     sys.exit(0)
 
-if __name__ == '__main__':
+def serve(host='0.0.0.0', port=5678, **server_options):
+    """Run the UI server; server_options are passed to the underlying WSGI server"""
     # Set up signal handlers
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
@@ -333,8 +438,16 @@ if __name__ == '__main__':
     os.makedirs(os.path.join(WORK_DIR, 'static'), exist_ok=True)
     
     try:
-        print(f"\n[+] Starting Proxy UI Server on http://localhost:5678")
+        print(f"\n[+] Starting Proxy UI Server on http://localhost:{port} ({socketio.async_mode} mode)")
         print(f"[+] Press Ctrl+C to stop\n")
-        socketio.run(app, host='0.0.0.0', port=5678, debug=False)
+        socketio.run(app, host=host, port=port, debug=False, **server_options)
     finally:
-        cleanup()
\ No newline at end of file
+        cleanup()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Proxy Monitor UI (development server)")
+    parser.add_argument('--host', default='0.0.0.0', help="Address to listen on (default: 0.0.0.0)")
+    parser.add_argument('--port', type=int, default=5678, help="Port to listen on (default: 5678)")
+    args = parser.parse_args()
+    
+    serve(args.host, args.port)
\ No newline at end of file
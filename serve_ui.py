@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Production server for the Proxy Monitor UI.
+
+Runs proxy_ui on an async worker model (gevent or eventlet) instead of the
+threaded development server, so hundreds of dashboard clients can stay
+connected over WebSockets without one thread each.
+
+    python serve_ui.py --host 0.0.0.0 --port 5678 --async-mode gevent --max-clients 1000
+
+To spread clients over several processes, start one server per port behind a
+load balancer with sticky sessions and share events through a message queue:
+
+    python serve_ui.py --port 5679 --message-queue redis://localhost:6379/0
+"""
+import argparse
+import os
+import sys
+
+parser = argparse.ArgumentParser(description="Proxy Monitor UI (production server)")
+parser.add_argument('--host', default='0.0.0.0', help="Address to listen on (default: 0.0.0.0)")
+parser.add_argument('--port', type=int, default=5678, help="Port to listen on (default: 5678)")
+parser.add_argument('--async-mode', choices=['gevent', 'eventlet'], default='gevent',
+                    help="Async worker model (default: gevent)")
+parser.add_argument('--max-clients', type=int, default=1000,
+                    help="Maximum concurrent connections handled by the worker pool (default: 1000)")
+parser.add_argument('--message-queue', default=None,
+                    help="Message queue URL shared by several server processes, e.g. redis://localhost:6379/0")
+args = parser.parse_args()
+
+# Monkey patching has to happen before anything else imports socket/threading
+try:
+    if args.async_mode == 'gevent':
+        from gevent import monkey
+        monkey.patch_all()
+    else:
+        import eventlet
+        eventlet.monkey_patch()
+except ImportError:
+    print(f"[!] {args.async_mode} is not installed. Install it with: pip install -r requirements_ui_prod.txt")
+    sys.exit(1)
+
+os.environ['PROXY_UI_ASYNC_MODE'] = args.async_mode
+if args.message_queue:
+    os.environ['PROXY_UI_MESSAGE_QUEUE'] = args.message_queue
+
+import proxy_ui  # noqa: E402
+
+if args.async_mode == 'gevent':
+    # Size of the greenlet pool serving connections
+    server_options = {'spawn': args.max_clients}
+else:
+    server_options = {'max_size': args.max_clients}
+
+proxy_ui.serve(args.host, args.port, **server_options)
@@ -17,14 +17,33 @@ fi
 # Activate virtual environment
 source "$VENV_DIR/bin/activate"
 
+# Use the async production server with --production; other arguments are passed on
+# (e.g. ./start_ui.sh --production --port 8080 --max-clients 2000)
+PRODUCTION=false
+SERVER_ARGS=()
+for arg in "$@"; do
+    if [ "$arg" = "--production" ]; then
+        PRODUCTION=true
+    else
+        SERVER_ARGS+=("$arg")
+    fi
+done
+
 # Install UI requirements if needed
 echo "[*] Checking UI dependencies..."
-pip install -q -r requirements_ui.txt
+if [ "$PRODUCTION" = true ]; then
+    pip install -q -r requirements_ui_prod.txt
+else
+    pip install -q -r requirements_ui.txt
+fi
 
 # Start the UI server
 echo "[*] Starting Proxy UI server..."
-echo "[+] Open http://localhost:5678 in your browser"
 echo "[+] Press Ctrl+C to stop"
 echo ""
 
-python proxy_ui.py
\ No newline at end of file
+if [ "$PRODUCTION" = true ]; then
+    python serve_ui.py "${SERVER_ARGS[@]}"
+else
+    python proxy_ui.py "${SERVER_ARGS[@]}"
+fi
\ No newline at end of file
@@ -19,6 +19,7 @@ document.addEventListener('DOMContentLoaded', () => {
     setupEventListeners();
     setupWebSocket();
     loadConfigurations();
+    loadTopClients();
     updateUI();
 });
 
@@ -46,6 +47,10 @@ function setupWebSocket() {
         addRequest(request);
     });
 
+    socket.on('top_clients', (clients) => {
+        renderTopClients(clients);
+    });
+
     socket.on('disconnect', () => {
         console.log('Disconnected from WebSocket');
     });
@@ -140,6 +145,35 @@ function updateUptime() {
     document.getElementById('uptime').textContent = parts.join(' ');
 }
 
+// Top Clients
+async function loadTopClients() {
+    try {
+        const response = await fetch('/api/proxy/clients');
+        renderTopClients(await response.json());
+    } catch (error) {
+        console.error('Failed to load top clients:', error);
+    }
+}
+
+function renderTopClients(clients) {
+    const tbody = document.getElementById('top-clients');
+
+    if (!clients.length) {
+        tbody.innerHTML = '<tr><td colspan="5" class="empty-state">No clients yet.</td></tr>';
+        return;
+    }
+
+    tbody.innerHTML = clients.map(client => `
+        <tr>
+            <td>${client.address}</td>
+            <td>${client.requests}</td>
+            <td>${client.traffic}</td>
+            <td>${client.connections}</td>
+            <td class="${client.throttled ? 'client-throttled' : ''}">${client.throttled}</td>
+        </tr>
+    `).join('');
+}
+
 // Request Management
 function addRequest(request) {
     // Handle response data
@@ -0,0 +1,28 @@
+"""Token bucket rate limiter, shared by the logging policy and client throttling"""
+import time
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, amount=1):
+        """Take tokens if available, return whether that succeeded"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True
+        return False
+
+    def reserve(self, amount=1):
+        """Take tokens even if that leaves a debt, return seconds to wait
+        until the debt is paid off (for pacing instead of dropping)"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate) - amount
+        self.updated = now
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
@@ -0,0 +1,177 @@
+"""
+User-Agent classification for the URL addons.
+
+Turns a User-Agent header into a short label like "Chrome 120 (macOS 10.15)"
+using the ordered rules in ua_rules.yaml. A fleet of clients sends very few
+distinct User-Agent strings, so labels are cached in a bounded LRU keyed by
+the header value and the regular expressions only run for new strings.
+
+Clients are also fingerprinted by their TLS ClientHello: a JA3 hash with the
+extensions sorted (browsers shuffle their order), shortened to 12 hex digits.
+The "fingerprints" section of ua_rules.yaml names known ones. A named
+fingerprint labels clients without a User-Agent and is added when it disagrees
+with the User-Agent (e.g. a script sending a browser's header); unknown
+clients without a User-Agent are labeled "TLS <fingerprint>".
+"""
+import collections
+import functools
+import hashlib
+import os
+import re
+
+import yaml
+
+DEFAULT_CACHE_SIZE = 1024
+
+# Maximum number of open client connections with a remembered fingerprint
+MAX_TRACKED_CONNECTIONS = 10000
+
+# TLS extensions whose contents are part of the JA3 string
+SUPPORTED_GROUPS = 10
+EC_POINT_FORMATS = 11
+
+
+def is_grease(value):
+    """GREASE values (RFC 8701) are random per handshake and ignored"""
+    return value & 0x0f0f == 0x0a0a
+
+
+def tls_fingerprint(client_hello):
+    """JA3 hash of a ClientHello with sorted extensions, 12 hex digits"""
+    raw = client_hello.raw_bytes(wrap_in_record=False)
+    version = int.from_bytes(raw[0:2], "big")
+    groups = []
+    point_formats = []
+    extensions = []
+    for ext_type, data in client_hello.extensions:
+        if is_grease(ext_type):
+            continue
+        extensions.append(ext_type)
+        if ext_type == SUPPORTED_GROUPS:
+            groups = [int.from_bytes(data[i:i + 2], "big") for i in range(2, len(data) - 1, 2)]
+        elif ext_type == EC_POINT_FORMATS:
+            point_formats = list(data[1:])
+    fields = [
+        [version],
+        [c for c in client_hello.cipher_suites if not is_grease(c)],
+        sorted(extensions),
+        [g for g in groups if not is_grease(g)],
+        point_formats,
+    ]
+    ja3 = ",".join("-".join(str(value) for value in field) for field in fields)
+    return hashlib.md5(ja3.encode()).hexdigest()[:12]
+
+
+class Rule:
+    def __init__(self, config):
+        self.pattern = re.compile(config["pattern"])
+        self.name = config["name"]
+        self.version = config.get("version")
+        if self.version is None and self.pattern.groups:
+            self.version = r"\1"
+
+    def match(self, user_agent):
+        """Return (name, version) if the rule matches, otherwise None"""
+        match = self.pattern.search(user_agent)
+        if match is None:
+            return None
+        name = match.expand(self.name)
+        version = match.expand(self.version) if self.version else ""
+        return name, version
+
+
+class UaClassifier:
+    def __init__(self, rules_file="ua_rules.yaml"):
+        self.rules_file = rules_file
+        self.app_rules = []
+        self.os_rules = []
+        self.fingerprint_names = {}
+        cache_size = self.load_rules()
+
+        # Bounded memoization of labels by User-Agent string
+        self.classify = functools.lru_cache(maxsize=cache_size)(self.parse)
+        self.combine = functools.lru_cache(maxsize=cache_size)(self.merge)
+
+        # TLS fingerprint per open client connection, oldest first
+        self.connections = collections.OrderedDict()
+
+    def load_rules(self):
+        """Load classification rules from YAML file, return the cache size"""
+        if not os.path.exists(self.rules_file):
+            return DEFAULT_CACHE_SIZE
+
+        try:
+            with open(self.rules_file, "r") as f:
+                config = yaml.safe_load(f) or {}
+            self.app_rules = [Rule(rule) for rule in config.get("apps") or []]
+            self.os_rules = [Rule(rule) for rule in config.get("os") or []]
+            self.fingerprint_names = {
+                str(fingerprint).lower(): self.clean(str(name))
+                for fingerprint, name in (config.get("fingerprints") or {}).items()
+            }
+        except Exception as e:
+            print(f"[!] Error loading User-Agent rules: {str(e)}")
+            self.app_rules = []
+            self.os_rules = []
+            self.fingerprint_names = {}
+            return DEFAULT_CACHE_SIZE
+
+        return config.get("cache_size", DEFAULT_CACHE_SIZE)
+
+    def first_match(self, rules, user_agent):
+        for rule in rules:
+            result = rule.match(user_agent)
+            if result:
+                return " ".join(part for part in result if part)
+        return ""
+
+    def parse(self, user_agent):
+        """Build the label for a User-Agent, "" if nothing is recognized"""
+        if not user_agent:
+            return ""
+
+        app = self.first_match(self.app_rules, user_agent)
+        platform = self.first_match(self.os_rules, user_agent)
+        if app and platform:
+            label = f"{app} ({platform})"
+        else:
+            label = app or platform
+
+        return self.clean(label)
+
+    def clean(self, label):
+        """The label ends up inside [...] in the log line"""
+        return label.replace("[", "(").replace("]", ")")
+
+    def client_hello(self, data):
+        """Remember the TLS fingerprint of a client connection (tls_clienthello hook)"""
+        client_id = data.context.client.id
+        self.connections[client_id] = tls_fingerprint(data.client_hello)
+        if len(self.connections) > MAX_TRACKED_CONNECTIONS:
+            self.connections.popitem(last=False)
+
+    def forget(self, client):
+        """Drop the fingerprint of a closed connection (client_disconnected hook)"""
+        self.connections.pop(client.id, None)
+
+    def label(self, flow):
+        """Label a flow by its User-Agent and its connection's TLS fingerprint"""
+        app = self.classify(flow.request.headers.get("User-Agent", ""))
+        fingerprint = self.connections.get(flow.client_conn.id)
+        if fingerprint is None:
+            return app
+        return self.combine(app, fingerprint)
+
+    def merge(self, app, fingerprint):
+        """Combine a User-Agent label with a TLS fingerprint"""
+        name = self.fingerprint_names.get(fingerprint)
+        if not app:
+            return name or f"TLS {fingerprint}"
+        if name and not app.startswith(name):
+            # The handshake doesn't belong to the client the header claims
+            return f"{app}, TLS: {name}"
+        return app
+
+    def cache_info(self):
+        """Hit/miss counts of the label cache"""
+        return self.classify.cache_info()
@@ -0,0 +1,350 @@
+"""
+Upstream connection pooling across client connections.
+
+mitmproxy opens a separate upstream connection for every client connection,
+so many short-lived clients talking to the same backends pay a TCP and TLS
+handshake each time. With this addon loaded, HTTP requests are sent upstream
+over a shared pool of keep-alive HTTP/1.1 connections, keyed by
+(scheme, host, port, SNI, TLS settings), and idle connections are
+reused by later requests from any client.
+
+Enable it with ./proxy.sh --pool, which also sets connection_strategy=lazy so
+mitmproxy doesn't open its own upstream connection up front. Limits:
+
+    upstream_pool_max_idle      idle connections kept per upstream (default 8)
+    upstream_pool_max_per_host  concurrent connections per upstream (default 32)
+    upstream_pool_idle_timeout  seconds before an idle connection is closed (default 30)
+
+Requests that can't safely share a connection (CONNECT, protocol upgrades such
+as WebSockets, streamed bodies, non-regular proxy modes) are left to mitmproxy.
+"""
+from mitmproxy import ctx, http
+import asyncio
+import collections
+import datetime
+import os
+import ssl
+import time
+
+import certifi
+import h11
+
+# Seconds to wait for an upstream response before giving up
+READ_TIMEOUT = 60
+
+# Methods that can be sent again if a reused connection dies before answering
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+# Headers that only apply to a single connection
+HOP_BY_HOP_HEADERS = {
+    b"connection", b"keep-alive", b"proxy-connection", b"proxy-authorization",
+    b"te", b"trailer", b"transfer-encoding", b"upgrade", b"expect",
+}
+
+
+class UpstreamError(Exception):
+    """Upstream request failed; `responded` tells whether a response had started"""
+
+    def __init__(self, message, responded):
+        super().__init__(message)
+        self.responded = responded
+
+
+class PooledConnection:
+    def __init__(self, key, reader, writer):
+        self.key = key
+        self.reader = reader
+        self.writer = writer
+        self.h11 = h11.Connection(h11.CLIENT)
+        self.idle_since = time.monotonic()
+
+    def usable(self, idle_timeout):
+        """Check if an idle connection can still be used"""
+        if self.writer.is_closing() or self.reader.at_eof():
+            return False
+        return time.monotonic() - self.idle_since < idle_timeout
+
+    def close(self):
+        self.writer.close()
+
+    async def send(self, method, target, headers, body):
+        """Send one request, return (status, reason, headers, body, reusable)"""
+        response = None
+        chunks = []
+        try:
+            data = self.h11.send(h11.Request(method=method, target=target, headers=headers))
+            if body:
+                data += self.h11.send(h11.Data(data=body))
+            data += self.h11.send(h11.EndOfMessage())
+            self.writer.write(data)
+            await self.writer.drain()
+
+            while True:
+                event = self.h11.next_event()
+                if event is h11.NEED_DATA:
+                    data = await asyncio.wait_for(self.reader.read(65536), READ_TIMEOUT)
+                    self.h11.receive_data(data)
+                elif isinstance(event, h11.Response):
+                    response = event
+                elif isinstance(event, h11.Data):
+                    chunks.append(event.data)
+                elif isinstance(event, (h11.EndOfMessage, h11.ConnectionClosed)):
+                    break
+                # InformationalResponse (1xx) is skipped
+        except (OSError, asyncio.TimeoutError, h11.ProtocolError) as e:
+            raise UpstreamError(str(e) or type(e).__name__, response is not None)
+
+        if response is None:
+            raise UpstreamError("connection closed before response", False)
+
+        reusable = self.h11.our_state is h11.DONE and self.h11.their_state is h11.DONE
+        if reusable:
+            self.h11.start_next_cycle()
+            self.idle_since = time.monotonic()
+
+        return response.status_code, response.reason, response.headers, b"".join(chunks), reusable
+
+
+class UpstreamPool:
+    def __init__(self):
+        # Idle connections per key, most recently used last
+        self.idle = {}
+        # Limits concurrent connections per key
+        self.slots = {}
+        self.reaper = None
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+        self.handshakes = 0
+        self.handshake_time = 0.0
+        self.retries = 0
+        self.tls_contexts = {}
+
+    def load(self, loader):
+        loader.add_option(
+            "upstream_pool_max_idle", int, 8,
+            "Idle keep-alive connections kept per upstream (host, port, TLS params)"
+        )
+        loader.add_option(
+            "upstream_pool_max_per_host", int, 32,
+            "Maximum concurrent pooled connections per upstream"
+        )
+        loader.add_option(
+            "upstream_pool_idle_timeout", int, 30,
+            "Seconds an idle pooled connection is kept open"
+        )
+
+    def running(self):
+        self.reaper = asyncio.ensure_future(self.reap_idle())
+
+    def done(self):
+        if self.reaper:
+            self.reaper.cancel()
+        for connections in self.idle.values():
+            for conn in connections:
+                conn.close()
+        self.idle.clear()
+        self.report()
+
+    async def reap_idle(self):
+        """Close idle connections that passed the idle timeout"""
+        while True:
+            timeout = ctx.options.upstream_pool_idle_timeout
+            await asyncio.sleep(max(timeout / 2, 1))
+            for key in list(self.idle):
+                alive = collections.deque()
+                for conn in self.idle[key]:
+                    if conn.usable(timeout):
+                        alive.append(conn)
+                    else:
+                        conn.close()
+                if alive:
+                    self.idle[key] = alive
+                else:
+                    del self.idle[key]
+
+    def tls_params(self, host):
+        """Upstream TLS settings for host, taken from mitmproxy's options"""
+        verify = not ctx.options.ssl_insecure
+        client_cert = None
+        if ctx.options.client_certs:
+            # A single certificate file, or a directory with one <host>.pem per server
+            client_certs = os.path.expanduser(ctx.options.client_certs)
+            if os.path.isfile(client_certs):
+                client_cert = client_certs
+            else:
+                path = os.path.join(client_certs, f"{host}.pem")
+                if os.path.isfile(path):
+                    client_cert = path
+        return (
+            verify,
+            ctx.options.ssl_verify_upstream_trusted_ca,
+            ctx.options.ssl_verify_upstream_trusted_confdir,
+            client_cert,
+        )
+
+    def tls_context(self, params):
+        if params not in self.tls_contexts:
+            verify, ca_file, ca_dir, client_cert = params
+            if verify:
+                # Same trust store as mitmproxy: certifi unless a CA is configured
+                if not ca_file and not ca_dir:
+                    ca_file = certifi.where()
+                context = ssl.create_default_context(cafile=ca_file, capath=ca_dir)
+            else:
+                context = ssl.create_default_context()
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+            if client_cert:
+                context.load_cert_chain(client_cert)
+            context.set_alpn_protocols(["http/1.1"])
+            self.tls_contexts[params] = context
+        return self.tls_contexts[params]
+
+    def can_pool(self, flow):
+        """Check if a flow can safely go over a shared upstream connection"""
+        request = flow.request
+        if flow.response is not None or request.method == "CONNECT":
+            return False
+        if request.scheme not in ("http", "https"):
+            return False
+        if "Upgrade" in request.headers or request.stream:
+            return False
+        # Interceptor file bodies are streamed from the local file server
+        if "file_body" in flow.metadata:
+            return False
+        # Upstream/reverse proxy modes decide the target themselves
+        return all(mode.startswith("regular") for mode in ctx.options.mode)
+
+    async def connect(self, key):
+        scheme, host, port, sni, tls = key
+        start = time.perf_counter()
+        if scheme == "https":
+            connecting = asyncio.open_connection(host, port, ssl=self.tls_context(tls), server_hostname=sni)
+        else:
+            connecting = asyncio.open_connection(host, port)
+        reader, writer = await asyncio.wait_for(connecting, READ_TIMEOUT)
+        self.handshake_time += time.perf_counter() - start
+        self.handshakes += 1
+        return PooledConnection(key, reader, writer)
+
+    def take_idle(self, key):
+        connections = self.idle.get(key)
+        while connections:
+            conn = connections.pop()
+            if conn.usable(ctx.options.upstream_pool_idle_timeout):
+                return conn
+            conn.close()
+        return None
+
+    def release(self, conn):
+        connections = self.idle.setdefault(conn.key, collections.deque())
+        if len(connections) < ctx.options.upstream_pool_max_idle:
+            connections.append(conn)
+        else:
+            conn.close()
+
+    def request_headers(self, request):
+        """Headers for the upstream request, without per-connection headers"""
+        headers = [(b"host", request.host_header.encode() if request.host_header else request.host.encode())]
+        for name, value in request.headers.fields:
+            if name.lower() not in HOP_BY_HOP_HEADERS and name.lower() != b"host":
+                headers.append((name, value))
+        body = request.raw_content or b""
+        if body or request.method in ("POST", "PUT", "PATCH"):
+            headers = [(n, v) for n, v in headers if n.lower() != b"content-length"]
+            headers.append((b"content-length", str(len(body)).encode()))
+        return headers, body
+
+    async def request(self, flow: http.HTTPFlow):
+        if not self.can_pool(flow):
+            return
+
+        request = flow.request
+        # Connections are only shared between requests with the same TLS settings
+        tls = self.tls_params(request.host) if request.scheme == "https" else None
+        key = (request.scheme, request.host, request.port, request.host, tls)
+        headers, body = self.request_headers(request)
+        target = request.path.encode()
+
+        if key not in self.slots:
+            self.slots[key] = asyncio.Semaphore(ctx.options.upstream_pool_max_per_host)
+
+        async with self.slots[key]:
+            timestamp_start = time.time()
+            conn = self.take_idle(key)
+            reused = conn is not None
+            try:
+                if conn is None:
+                    conn = await self.connect(key)
+                try:
+                    result = await conn.send(request.method.encode(), target, headers, body)
+                except UpstreamError as e:
+                    conn.close()
+                    # The server may have closed a reused idle connection in the
+                    # meantime; like browsers, retry once if nothing came back.
+                    # Other methods may already have been applied, so they fail
+                    if not reused or e.responded or request.method not in IDEMPOTENT_METHODS:
+                        raise
+                    self.retries += 1
+                    reused = False
+                    conn = await self.connect(key)
+                    result = await conn.send(request.method.encode(), target, headers, body)
+            except UpstreamError as e:
+                conn.close()
+                flow.response = http.Response.make(502, f"Upstream error: {e}".encode(), {"Content-Type": "text/plain"})
+                return
+            except (OSError, asyncio.TimeoutError):
+                # Couldn't connect at all; let mitmproxy try and report the error itself
+                return
+
+            # A request counts as a hit only if it was answered over a reused connection
+            if reused:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+            status_code, reason, response_headers, response_body, reusable = result
+            if reusable:
+                self.release(conn)
+            else:
+                conn.close()
+
+        fields = [(n, v) for n, v in response_headers if n.lower() not in HOP_BY_HOP_HEADERS]
+        if request.method != "HEAD" and not any(n.lower() == b"content-length" for n, v in fields):
+            fields.append((b"content-length", str(len(response_body)).encode()))
+
+        flow.response = http.Response(
+            http_version=b"HTTP/1.1",
+            status_code=status_code,
+            reason=reason,
+            headers=http.Headers(fields),
+            content=response_body,
+            trailers=None,
+            timestamp_start=timestamp_start,
+            timestamp_end=time.time(),
+        )
+
+    def report(self):
+        """Print and log the pool hit rate and handshake time saved"""
+        total = self.hits + self.misses
+        if not total:
+            return
+
+        average_handshake = self.handshake_time / self.handshakes if self.handshakes else 0.0
+        summary = (
+            f"Upstream pool: {self.hits}/{total} requests reused a connection "
+            f"({self.hits / total:.0%} hit rate), {self.handshakes} handshakes, {self.retries} retries, "
+            f"~{self.hits * average_handshake:.2f}s handshake time saved "
+            f"({average_handshake * 1000:.1f} ms per handshake)"
+        )
+        print(f"\n[+] {summary}")
+
+        os.makedirs("logs", exist_ok=True)
+        with open("logs/url_log.txt", "a") as f:
+            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            f.write(f"\n[{timestamp}] {summary}\n")
+
+# Configure mitmproxy to use our addon
+addons = [UpstreamPool()]
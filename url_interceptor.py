@@ -1,5 +1,7 @@
 import mitmproxy.http
+import mitmproxy.tls
 from mitmproxy import ctx
+import asyncio
 import os
 import datetime
 import sys
@@ -7,6 +9,13 @@ import re
 import json
 import yaml
 
+from console_renderer import get_renderer
+from content_encoding import compress_variants, negotiate, rule_encodings
+from file_bodies import FileServer
+from flow_utils import full_url, load_domain_list, match_domain, request_host
+from log_policy import LogPolicy
+from ua_classifier import UaClassifier
+
 class UrlInterceptor:
     def __init__(self):
         # Create logs directory if it doesn't exist
@@ -15,9 +24,26 @@ class UrlInterceptor:
         # Use a single master log file
         self.log_file = "logs/url_log.txt"
         
+        # Console output goes through a non-blocking renderer
+        self.console = get_renderer()
+        
+        # Decides which flows are logged when traffic is heavy
+        self.log_policy = LogPolicy()
+        self.reporter = None
+        
+        # Labels requests with the client that sent them
+        self.ua_classifier = UaClassifier()
+        
         # Load domain blacklist
-        self.blacklisted_domains = []
-        self.load_blacklist()
+        # Domains from domain_blacklist.txt, matched including subdomains
+        self.blacklisted_domains = set(load_domain_list("domain_blacklist.txt"))
+        
+        # Serves rules with a file body, see file_bodies.py
+        self.file_server = FileServer()
+        self.file_routes = {}
+        
+        # Compressed variants of rules with compress, by pattern
+        self.compressed_bodies = {}
         
         # Load interceptor configuration
         self.interceptor_config = {}
@@ -27,7 +53,7 @@ class UrlInterceptor:
         with open(self.log_file, "a") as f:
             f.write(f"\n=== Proxy Session Started at {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ===\n\n")
             if self.blacklisted_domains:
-                f.write(f"Blacklisted domains: {', '.join(self.blacklisted_domains)}\n")
+                f.write(f"Blacklisted domains: {', '.join(sorted(self.blacklisted_domains))}\n")
             if self.interceptor_config:
                 f.write(f"Intercepting {len(self.interceptor_config)} URL patterns\n")
             f.write("\n")
@@ -43,21 +69,71 @@ class UrlInterceptor:
         if self.interceptor_config:
             print(f"[+] Intercepting {len(self.interceptor_config)} URL patterns")
             for url in self.interceptor_config:
-                print(f"    - {url}")
+                if url in self.file_routes:
+                    body = self.file_server.bodies[self.file_routes[url]]
+                    print(f"    - {url} (file: {body.path}, {body.size} bytes)")
+                else:
+                    print(f"    - {url}")
         
         print("")
     
-    def load_blacklist(self):
-        """Load the domain blacklist from domain_blacklist.txt"""
-        blacklist_file = "domain_blacklist.txt"
+    def load(self, loader):
+        loader.add_option(
+            "console_rate_limit", int, 30,
+            "Requests per second above which the console switches to a summary view"
+        )
+        loader.add_option(
+            "console_summary", str, "auto",
+            "Summary view when the request rate is too high: auto (terminal only), on or off",
+            choices=["auto", "on", "off"]
+        )
+    
+    def configure(self, updated):
+        if "console_rate_limit" in updated:
+            self.console.max_lines_per_sec = ctx.options.console_rate_limit
+        if "console_summary" in updated:
+            self.console.summary = ctx.options.console_summary
+    
+    async def running(self):
+        self.reporter = asyncio.ensure_future(self.report_periodically())
+        if self.file_routes:
+            await self.file_server.start()
+    
+    def done(self):
+        if self.reporter:
+            self.reporter.cancel()
+        self.file_server.close()
+        if self.file_server.served:
+            summary = f"Served {self.file_server.served} file responses ({self.file_server.bytes_sent} bytes)"
+            self.console.info(f"\n[+] {summary}")
+            with open(self.log_file, "a") as f:
+                f.write(f"\n{summary}\n")
         
-        if os.path.exists(blacklist_file):
-            with open(blacklist_file, "r") as f:
-                for line in f:
-                    # Remove comments and whitespace
-                    line = line.split('#')[0].strip()
-                    if line:  # Skip empty lines
-                        self.blacklisted_domains.append(line)
+        self.report_skipped(force=True)
+        if self.log_policy.total_skipped:
+            summary = f"Logging policy skipped {self.log_policy.total_skipped} of {self.log_policy.total_seen} requests"
+            self.console.info(f"\n[+] {summary}")
+            with open(self.log_file, "a") as f:
+                f.write(f"\n{summary}\n")
+        
+        # Write out whatever is still queued
+        self.console.close()
+    
+    async def report_periodically(self):
+        """Report skipped flows on a timer, also when no new requests arrive"""
+        while True:
+            await asyncio.sleep(max(self.log_policy.report_interval, 1))
+            self.report_skipped(force=True)
+    
+    def report_skipped(self, force=False):
+        """Print and log how many flows the logging policy skipped"""
+        summary = self.log_policy.report(force)
+        if summary:
+            timestamp = datetime.datetime.now().strftime("%H:%M:%S")
+            message = f"[{timestamp}] ·· {summary}"
+            self.console.info(message)
+            with open(self.log_file, "a") as f:
+                f.write(message + "\n")
     
     def load_interceptor_config(self):
         """Load the interceptor configuration from YAML file"""
@@ -69,19 +145,44 @@ class UrlInterceptor:
                     self.interceptor_config = yaml.safe_load(f) or {}
             except Exception as e:
                 print(f"[!] Error loading interceptor config: {str(e)}")
+        
+        if not isinstance(self.interceptor_config, dict):
+            print("[!] Error loading interceptor config: expected a mapping of URL patterns to rules")
+            self.interceptor_config = {}
+        
+        # Rules with a file body are served from disk instead of memory
+        for pattern, config in list(self.interceptor_config.items()):
+            if not isinstance(config, dict):
+                print(f"[!] Rule '{pattern}' is empty or not a mapping of settings, ignoring it")
+                del self.interceptor_config[pattern]
+            elif "file" in config:
+                path = config["file"]
+                if not os.path.isfile(path):
+                    print(f"[!] File for rule '{pattern}' not found: {path}")
+                self.file_routes[pattern] = self.file_server.register(
+                    path, config.get("status", 200), config.get("headers", {})
+                )
+            elif config.get("compress"):
+                # Compress once here, requests only pick a variant
+                try:
+                    encodings = rule_encodings(config["compress"])
+                except ValueError as e:
+                    print(f"[!] Invalid compress setting for rule '{pattern}': {str(e)}")
+                    continue
+                if any(k.lower() == "content-encoding" for k in config.get("headers", {})):
+                    print(f"[!] Rule '{pattern}' sets Content-Encoding itself, not compressing")
+                    continue
+                self.compressed_bodies[pattern] = compress_variants(self.rule_body(config), encodings)
     
     def is_blacklisted(self, host):
         """Check if a host matches any blacklisted domain"""
-        for domain in self.blacklisted_domains:
-            # Check for exact match or subdomain match
-            if host == domain or host.endswith('.' + domain):
-                return True
-        return False
+        # Same matching as passthrough.py: exact or subdomain, case-insensitive
+        return match_domain(host, self.blacklisted_domains) is not None
     
     def should_intercept(self, flow):
         """Check if the request should be intercepted"""
-        url = flow.request.pretty_url
-        host = flow.request.host
+        url = full_url(flow.request)
+        host = request_host(flow.request)
         path = flow.request.path
         
         # Check exact URL match first (without protocol)
@@ -110,47 +211,80 @@ class UrlInterceptor:
         """Apply interception rules to a flow"""
         config = self.interceptor_config[pattern]
         
+        # File bodies are fetched from the local file server and streamed
+        # through, so the file is never held in memory
+        if pattern in self.file_routes:
+            if not self.file_server.port:
+                self.console.info(f"[!] File server not running, answering rule '{pattern}' with 503")
+                flow.response = mitmproxy.http.Response.make(
+                    503, b"File server not running", {"Content-Type": "text/plain"}
+                )
+                return
+            flow.metadata["file_body"] = self.file_server.bodies[self.file_routes[pattern]].path
+            # Rewriting the target also rewrites Host/:authority, keep the host
+            # the client asked for for logging
+            flow.metadata["original_host"] = request_host(flow.request)
+            flow.request.scheme = "http"
+            flow.request.host = "127.0.0.1"
+            flow.request.port = self.file_server.port
+            flow.request.path = self.file_routes[pattern]
+            return
+        
         # Set the response status code (default to 200 if not specified)
         status_code = config.get("status", 200)
         
-        # Set the response content
+        # Set headers
+        headers = {k: str(v) for k, v in config.get("headers", {}).items()}
+        
+        if pattern not in self.compressed_bodies:
+            # Create a response using the correct mitmproxy API
+            flow.response = mitmproxy.http.Response.make(status_code, self.rule_body(config), headers)
+            return
+        
+        # Pick the pre-compressed variant the client accepts
+        variants = self.compressed_bodies[pattern]
+        encoding, body = negotiate(flow.request.headers.get("Accept-Encoding"), variants)
+        
+        # The body is already encoded, so Content-Encoding is added after
+        # make() to keep mitmproxy from encoding it again
+        flow.response = mitmproxy.http.Response.make(status_code, body, headers)
+        if encoding != "identity":
+            flow.response.headers["Content-Encoding"] = encoding
+        if len(variants) > 1:
+            vary = flow.response.headers.get("Vary", "")
+            if "accept-encoding" not in vary.lower():
+                flow.response.headers["Vary"] = f"{vary}, Accept-Encoding" if vary else "Accept-Encoding"
+    
+    def rule_body(self, config):
+        """Body of an inline rule as bytes"""
         content = config.get("content", "")
         
         # Convert content to a string if it's a dict/list (for JSON)
         if isinstance(content, (dict, list)):
             content = json.dumps(content)
         
-        # Set headers
-        headers = config.get("headers", {})
-        
-        # Create a response using the correct mitmproxy API
-        flow.response = mitmproxy.http.Response.make(
-            status_code,
-            content.encode() if isinstance(content, str) else content,
-            {k: str(v) for k, v in headers.items()}
-        )
+        return content.encode() if isinstance(content, str) else content
+    
+    def tls_clienthello(self, data: mitmproxy.tls.ClientHelloData):
+        # Fingerprint the client's handshake for the app label
+        self.ua_classifier.client_hello(data)
+    
+    def client_disconnected(self, client):
+        self.ua_classifier.forget(client)
     
     def request(self, flow: mitmproxy.http.HTTPFlow):
-        # Get the URL and method
-        url = flow.request.pretty_url
+        # Get the URL and method (built from :authority for HTTP/2 flows)
+        url = full_url(flow.request)
         method = flow.request.method
         
         # Check if the domain is blacklisted
-        host = flow.request.host
+        host = request_host(flow.request)
         if self.is_blacklisted(host):
             return
         
-        # Get the User-Agent to identify the app
-        user_agent = flow.request.headers.get("User-Agent", "")
-        
-        # Extract app info from User-Agent if possible
-        app_info = ""
-        if "Safari" in user_agent:
-            app_info = "Safari"
-        elif "Chrome" in user_agent:
-            app_info = "Chrome"
-        elif "Firefox" in user_agent:
-            app_info = "Firefox"
+        # Label the client (app, version, OS) from its User-Agent and TLS
+        # fingerprint, cached per User-Agent string
+        app_info = self.ua_classifier.label(flow)
         
         # Format the log message with timestamp
         timestamp = datetime.datetime.now().strftime("%H:%M:%S")
@@ -160,14 +294,21 @@ class UrlInterceptor:
         if pattern:
             # Log the interception
             intercept_msg = f"[{timestamp}] INTERCEPTING {method} {url} -> using rule '{pattern}'"
-            print(intercept_msg, flush=True)
+            
+            # Apply the interception
+            self.apply_intercept(flow, pattern)
+            
+            # Keep the line of skipped flows in case they turn out to be errors
+            if not self.log_policy.should_log(host, always=self.log_policy.always_log_intercepted):
+                flow.metadata["deferred_log_line"] = intercept_msg
+                self.console.count(host)
+                return
+            
+            self.console.request(intercept_msg, host)
             
             # Write to log file
             with open(self.log_file, "a") as f:
                 f.write(intercept_msg + "\n")
-            
-            # Apply the interception
-            self.apply_intercept(flow, pattern)
         else:
             # Normal request (not intercepted)
             if app_info:
@@ -175,23 +316,49 @@ class UrlInterceptor:
             else:
                 full_message = f"[{timestamp}] {method} {url}"
                 
-            # Print directly to stdout
-            print(full_message, flush=True)
+            # Keep the line of skipped flows in case they turn out to be errors
+            if not self.log_policy.should_log(host):
+                flow.metadata["deferred_log_line"] = full_message
+                self.console.count(host)
+                return
+            
+            # Print to stdout (via the renderer)
+            self.console.request(full_message, host)
             
             # Write to log file
             with open(self.log_file, "a") as f:
                 f.write(full_message + "\n")
     
+    def responseheaders(self, flow: mitmproxy.http.HTTPFlow):
+        # Pass file bodies through in chunks instead of buffering them
+        if "file_body" in flow.metadata:
+            flow.response.stream = True
+            # The file server closes every connection, the client doesn't have to
+            flow.response.headers.pop("Connection", None)
+    
+    def flow_host(self, flow):
+        """Host the client asked for, also after a file body rewrote the target"""
+        return flow.metadata.get("original_host") or request_host(flow.request)
+    
     def response(self, flow: mitmproxy.http.HTTPFlow):
         """Handle responses, especially for POST requests"""
-        # Only process POST responses that aren't blacklisted
-        if flow.request.method != "POST":
-            return
-            
-        host = flow.request.host
+        host = self.flow_host(flow)
         if self.is_blacklisted(host):
             return
         
+        deferred_line = flow.metadata.pop("deferred_log_line", None)
+        if deferred_line is not None:
+            # The request was skipped by the logging policy; errors are logged anyway
+            if not self.log_policy.is_error(flow):
+                self.log_policy.skipped(host)
+                return
+            self.console.request(deferred_line)
+            with open(self.log_file, "a") as f:
+                f.write(deferred_line + "\n")
+        elif flow.request.method != "POST":
+            # Only process POST responses otherwise
+            return
+        
         # Get response details
         status_code = flow.response.status_code
         content_type = flow.response.headers.get("Content-Type", "")
@@ -202,7 +369,12 @@ class UrlInterceptor:
         
         # Try to get response body
         try:
-            response_body = flow.response.text
+            if "file_body" in flow.metadata:
+                # Streamed from disk, the body was never loaded
+                length = flow.response.headers.get("Content-Length", "0")
+                response_body = f"(file: {flow.metadata['file_body']}, {length} bytes)"
+            else:
+                response_body = flow.response.text
             
             # Limit response body display
             if len(response_body) > 500:
@@ -216,32 +388,46 @@ class UrlInterceptor:
                 except:
                     pass
             
-            # Display response
-            print(f"{response_msg} {content_type}", flush=True)
             if response_body.strip():
                 # Indent response body
                 indented_body = "\n".join("    " + line for line in response_body.split("\n"))
-                print(indented_body, flush=True)
-                print("", flush=True)  # Empty line for readability
+                
+                # Display response, with an empty line for readability
+                self.console.detail(f"{response_msg} {content_type}\n{indented_body}\n")
                 
                 # Log to file
                 with open(self.log_file, "a") as f:
                     f.write(f"{response_msg} {content_type}\n")
                     f.write(indented_body + "\n\n")
             else:
-                print("    (empty response)", flush=True)
-                print("", flush=True)
+                self.console.detail(f"{response_msg} {content_type}\n    (empty response)\n")
                 
                 with open(self.log_file, "a") as f:
                     f.write(f"{response_msg} {content_type}\n    (empty response)\n\n")
                     
         except Exception as e:
             error_msg = f"    Error reading response: {str(e)}"
-            print(error_msg, flush=True)
-            print("", flush=True)
+            self.console.detail(f"{error_msg}\n")
             
             with open(self.log_file, "a") as f:
                 f.write(f"{response_msg}\n{error_msg}\n\n")
+    
+    def error(self, flow: mitmproxy.http.HTTPFlow):
+        """Handle flows that failed without a response"""
+        deferred_line = flow.metadata.pop("deferred_log_line", None)
+        if deferred_line is None:
+            return
+        
+        host = self.flow_host(flow)
+        if not self.log_policy.is_error(flow):
+            self.log_policy.skipped(host)
+            return
+        
+        # Connection errors are always logged, even if the request was skipped
+        error_msg = f"{deferred_line}\n    Error: {flow.error.msg}"
+        self.console.request(error_msg + "\n")
+        with open(self.log_file, "a") as f:
+            f.write(error_msg + "\n\n")
 
 # Configure mitmproxy to use our addon
 addons = [UrlInterceptor()]
\ No newline at end of file
@@ -1,11 +1,18 @@
 import mitmproxy.http
+import mitmproxy.tls
 from mitmproxy import ctx
+import asyncio
 import os
 import datetime
 import sys
 import re
 import json
 
+from console_renderer import get_renderer
+from flow_utils import full_url, load_domain_list, match_domain, request_host
+from log_policy import LogPolicy
+from ua_classifier import UaClassifier
+
 class UrlOnly:
     def __init__(self):
         # Create logs directory if it doesn't exist
@@ -14,15 +21,25 @@ class UrlOnly:
         # Use a single master log file
         self.log_file = "logs/url_log.txt"
         
+        # Console output goes through a non-blocking renderer
+        self.console = get_renderer()
+        
+        # Decides which flows are logged when traffic is heavy
+        self.log_policy = LogPolicy()
+        self.reporter = None
+        
+        # Labels requests with the client that sent them
+        self.ua_classifier = UaClassifier()
+        
         # Load domain blacklist
-        self.blacklisted_domains = []
-        self.load_blacklist()
+        # Domains from domain_blacklist.txt, matched including subdomains
+        self.blacklisted_domains = set(load_domain_list("domain_blacklist.txt"))
         
         # Log the start of the session
         with open(self.log_file, "a") as f:
             f.write(f"\n=== Proxy Session Started at {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ===\n\n")
             if self.blacklisted_domains:
-                f.write(f"Blacklisted domains: {', '.join(self.blacklisted_domains)}\n\n")
+                f.write(f"Blacklisted domains: {', '.join(sorted(self.blacklisted_domains))}\n\n")
         
         # Print a message to indicate the log file location
         print(f"\n[+] URL logs are being saved to: {self.log_file}")
@@ -36,39 +53,75 @@ class UrlOnly:
             print(f"[+] No domains blacklisted. Add domains to domain_blacklist.txt to ignore them.")
         print("")
     
-    def load_blacklist(self):
-        """Load the domain blacklist from domain_blacklist.txt"""
-        blacklist_file = "domain_blacklist.txt"
-        
-        if os.path.exists(blacklist_file):
-            with open(blacklist_file, "r") as f:
-                for line in f:
-                    # Remove comments and whitespace
-                    line = line.split('#')[0].strip()
-                    if line:  # Skip empty lines
-                        self.blacklisted_domains.append(line)
+    def load(self, loader):
+        loader.add_option(
+            "console_rate_limit", int, 30,
+            "Requests per second above which the console switches to a summary view"
+        )
+        loader.add_option(
+            "console_summary", str, "auto",
+            "Summary view when the request rate is too high: auto (terminal only), on or off",
+            choices=["auto", "on", "off"]
+        )
+    
+    def configure(self, updated):
+        if "console_rate_limit" in updated:
+            self.console.max_lines_per_sec = ctx.options.console_rate_limit
+        if "console_summary" in updated:
+            self.console.summary = ctx.options.console_summary
+    
+    def running(self):
+        self.reporter = asyncio.ensure_future(self.report_periodically())
+    
+    def done(self):
+        if self.reporter:
+            self.reporter.cancel()
+        self.report_skipped(force=True)
+        if self.log_policy.total_skipped:
+            summary = f"Logging policy skipped {self.log_policy.total_skipped} of {self.log_policy.total_seen} requests"
+            self.console.info(f"\n[+] {summary}")
+            with open(self.log_file, "a") as f:
+                f.write(f"\n{summary}\n")
+        
+        # Write out whatever is still queued
+        self.console.close()
+    
+    async def report_periodically(self):
+        """Report skipped flows on a timer, also when no new requests arrive"""
+        while True:
+            await asyncio.sleep(max(self.log_policy.report_interval, 1))
+            self.report_skipped(force=True)
+    
+    def report_skipped(self, force=False):
+        """Print and log how many flows the logging policy skipped"""
+        summary = self.log_policy.report(force)
+        if summary:
+            timestamp = datetime.datetime.now().strftime("%H:%M:%S")
+            message = f"[{timestamp}] ·· {summary}"
+            self.console.info(message)
+            with open(self.log_file, "a") as f:
+                f.write(message + "\n")
+    
+    def tls_clienthello(self, data: mitmproxy.tls.ClientHelloData):
+        # Fingerprint the client's handshake for the app label
+        self.ua_classifier.client_hello(data)
+    
+    def client_disconnected(self, client):
+        self.ua_classifier.forget(client)
     
     def request(self, flow: mitmproxy.http.HTTPFlow):
-        # Get the URL and method
-        url = flow.request.pretty_url
+        # Get the URL and method (built from :authority for HTTP/2 flows)
+        url = full_url(flow.request)
         method = flow.request.method
         
         # Check if the domain is blacklisted
-        host = flow.request.host
+        host = request_host(flow.request)
         if self.is_blacklisted(host):
             return
         
-        # Get the User-Agent to identify the app
-        user_agent = flow.request.headers.get("User-Agent", "")
-        
-        # Extract app info from User-Agent if possible
-        app_info = ""
-        if "Safari" in user_agent:
-            app_info = "Safari"
-        elif "Chrome" in user_agent:
-            app_info = "Chrome"
-        elif "Firefox" in user_agent:
-            app_info = "Firefox"
+        # Label the client (app, version, OS) from its User-Agent and TLS
+        # fingerprint, cached per User-Agent string
+        app_info = self.ua_classifier.label(flow)
         
         # Format the log message with timestamp
         timestamp = datetime.datetime.now().strftime("%H:%M:%S")
@@ -79,8 +132,14 @@ class UrlOnly:
         else:
             full_message = f"[{timestamp}] {method} {url}"
             
-        # Print directly to stdout to bypass mitmproxy's formatting
-        print(full_message, flush=True)
+        # Keep the line of skipped flows in case they turn out to be errors
+        if not self.log_policy.should_log(host):
+            flow.metadata["deferred_log_line"] = full_message
+            self.console.count(host)
+            return
+        
+        # Print to stdout (via the renderer) to bypass mitmproxy's formatting
+        self.console.request(full_message, host)
         
         # Write to log file
         with open(self.log_file, "a") as f:
@@ -88,22 +147,28 @@ class UrlOnly:
     
     def is_blacklisted(self, host):
         """Check if a host matches any blacklisted domain"""
-        for domain in self.blacklisted_domains:
-            # Check for exact match or subdomain match
-            if host == domain or host.endswith('.' + domain):
-                return True
-        return False
+        # Same matching as passthrough.py: exact or subdomain, case-insensitive
+        return match_domain(host, self.blacklisted_domains) is not None
     
     def response(self, flow: mitmproxy.http.HTTPFlow):
         """Handle responses, especially for POST requests"""
-        # Only process POST responses that aren't blacklisted
-        if flow.request.method != "POST":
-            return
-            
-        host = flow.request.host
+        host = request_host(flow.request)
         if self.is_blacklisted(host):
             return
         
+        deferred_line = flow.metadata.pop("deferred_log_line", None)
+        if deferred_line is not None:
+            # The request was skipped by the logging policy; errors are logged anyway
+            if not self.log_policy.is_error(flow):
+                self.log_policy.skipped(host)
+                return
+            self.console.request(deferred_line)
+            with open(self.log_file, "a") as f:
+                f.write(deferred_line + "\n")
+        elif flow.request.method != "POST":
+            # Only process POST responses otherwise
+            return
+        
         # Get response details
         status_code = flow.response.status_code
         content_type = flow.response.headers.get("Content-Type", "")
@@ -128,32 +193,46 @@ class UrlOnly:
                 except:
                     pass
             
-            # Display response
-            print(f"{response_msg} {content_type}", flush=True)
             if response_body.strip():
                 # Indent response body
                 indented_body = "\n".join("    " + line for line in response_body.split("\n"))
-                print(indented_body, flush=True)
-                print("", flush=True)  # Empty line for readability
+                
+                # Display response, with an empty line for readability
+                self.console.detail(f"{response_msg} {content_type}\n{indented_body}\n")
                 
                 # Log to file
                 with open(self.log_file, "a") as f:
                     f.write(f"{response_msg} {content_type}\n")
                     f.write(indented_body + "\n\n")
             else:
-                print("    (empty response)", flush=True)
-                print("", flush=True)
+                self.console.detail(f"{response_msg} {content_type}\n    (empty response)\n")
                 
                 with open(self.log_file, "a") as f:
                     f.write(f"{response_msg} {content_type}\n    (empty response)\n\n")
                     
         except Exception as e:
             error_msg = f"    Error reading response: {str(e)}"
-            print(error_msg, flush=True)
-            print("", flush=True)
+            self.console.detail(f"{error_msg}\n")
             
             with open(self.log_file, "a") as f:
                 f.write(f"{response_msg}\n{error_msg}\n\n")
+    
+    def error(self, flow: mitmproxy.http.HTTPFlow):
+        """Handle flows that failed without a response"""
+        deferred_line = flow.metadata.pop("deferred_log_line", None)
+        if deferred_line is None:
+            return
+        
+        host = request_host(flow.request)
+        if not self.log_policy.is_error(flow):
+            self.log_policy.skipped(host)
+            return
+        
+        # Connection errors are always logged, even if the request was skipped
+        error_msg = f"{deferred_line}\n    Error: {flow.error.msg}"
+        self.console.request(error_msg + "\n")
+        with open(self.log_file, "a") as f:
+            f.write(error_msg + "\n\n")
 
 # Configure mitmproxy to use our addon
 addons = [UrlOnly()]